@@ -0,0 +1,106 @@
+"""
+Synthetic databases for benchmarking the pipeline.
+
+The tables have the columns the transformers of pycon-config.yaml and
+users-config.yaml change, plus some untouched payload, and are filled
+deterministically so that runs on different commits work on the same data.
+"""
+SCHEMA = '''
+CREATE TABLE users (
+    id serial PRIMARY KEY,
+    full_name text NOT NULL,
+    name text NOT NULL,
+    password text NOT NULL,
+    email text NOT NULL UNIQUE,
+    username text NOT NULL UNIQUE,
+    jwt_auth_id integer NOT NULL,
+    date_birth date,
+    is_staff boolean NOT NULL DEFAULT false,
+    bio text NOT NULL
+);
+
+CREATE TABLE conferences_conference (
+    id serial PRIMARY KEY,
+    name text NOT NULL,
+    pretix_organizer_id text NOT NULL,
+    pretix_event_id text NOT NULL,
+    pretix_speaker_voucher_quota_id integer
+);
+
+CREATE TABLE grants_grant (
+    id serial PRIMARY KEY,
+    user_id integer NOT NULL REFERENCES users (id),
+    conference_id integer NOT NULL REFERENCES conferences_conference (id),
+    name text NOT NULL,
+    full_name text NOT NULL,
+    email text NOT NULL,
+    occupation text NOT NULL,
+    grant_type text NOT NULL,
+    python_usage text NOT NULL,
+    been_to_other_events text NOT NULL,
+    interested_in_volunteering text NOT NULL,
+    why text NOT NULL,
+    notes text NOT NULL,
+    travelling_from text NOT NULL
+);
+CREATE INDEX grants_grant_user_id ON grants_grant (user_id);
+
+CREATE TABLE submissions_submission (
+    id serial PRIMARY KEY,
+    speaker_id integer NOT NULL REFERENCES users (id),
+    conference_id integer NOT NULL REFERENCES conferences_conference (id),
+    title text NOT NULL,
+    abstract text NOT NULL,
+    previous_talk_video text NOT NULL,
+    notes text NOT NULL
+);
+CREATE INDEX submissions_submission_speaker_id ON submissions_submission (speaker_id);
+'''
+
+DEFAULT_ROWS = {
+    'users': 100_000,
+    'conferences_conference': 10,
+    'grants_grant': 20_000,
+    'submissions_submission': 50_000,
+}
+DEFAULT_TEXT_SIZE = 200
+
+
+def _text(seed: str, size: int) -> str:
+    # deterministic filler of the requested size
+    return f"left(repeat(md5({seed}::text), {size // 32 + 1}), {size})"
+
+
+def data_sql(rows: dict[str, int], text_size: int = DEFAULT_TEXT_SIZE) -> str:
+    users = rows['users']
+    conferences = rows['conferences_conference']
+
+    return f'''
+INSERT INTO users (full_name, name, password, email, username, jwt_auth_id, date_birth, is_staff, bio)
+SELECT
+    'Full Name ' || i, 'Name ' || i, 'pbkdf2_sha256$' || md5(i::text), 'user' || i || '@example.com',
+    'user' || i, i, date '1950-01-01' + (i % 20000), i % 50 = 0, {_text("'bio' || i", text_size)}
+FROM generate_series(1, {users}) AS i;
+
+INSERT INTO conferences_conference (name, pretix_organizer_id, pretix_event_id, pretix_speaker_voucher_quota_id)
+SELECT 'PyCon ' || i, 'organizer', 'event-' || i, i
+FROM generate_series(1, {conferences}) AS i;
+
+INSERT INTO grants_grant (
+    user_id, conference_id, name, full_name, email, occupation, grant_type, python_usage,
+    been_to_other_events, interested_in_volunteering, why, notes, travelling_from
+)
+SELECT
+    1 + i % {users}, 1 + i % {conferences}, 'Name ' || i, 'Full Name ' || i, 'user' || i || '@example.com',
+    'developer', 'speaker', {_text("'usage' || i", text_size)}, {_text("'events' || i", text_size)}, 'yes',
+    {_text("'why' || i", text_size)}, {_text("'notes' || i", text_size)}, {_text("'from' || i", text_size)}
+FROM generate_series(1, {rows['grants_grant']}) AS i;
+
+INSERT INTO submissions_submission (speaker_id, conference_id, title, abstract, previous_talk_video, notes)
+SELECT
+    1 + i % {users}, 1 + i % {conferences}, 'Talk ' || i, {_text("'abstract' || i", text_size)},
+    'https://example.com/' || i, {_text("'notes' || i", text_size)}
+FROM generate_series(1, {rows['submissions_submission']}) AS i;
+
+ANALYZE;
+'''
@@ -0,0 +1,35 @@
+-- Times the fake value functions of transformers/functions.sql, which has to
+-- be loaded first. Compare implementations by running it against each
+-- version, each in its own database. benchmarks/functions-text-arrays.sql
+-- keeps the functions from before the name[] dictionaries:
+--
+--   createdb bench_before
+--   psql -q -d bench_before -f benchmarks/functions-text-arrays.sql -v rows=1000000 -f benchmarks/functions.sql
+--   createdb bench_after
+--   psql -q -d bench_after -f transformers/functions.sql -v rows=1000000 -f benchmarks/functions.sql
+\if :{?rows}
+\else
+    \set rows 100000
+\endif
+
+\timing on
+
+\echo random_first_name
+SELECT count(random_first_name()) FROM generate_series(1, :rows);
+
+\echo random_last_name
+SELECT count(random_last_name()) FROM generate_series(1, :rows);
+
+\echo random_word
+SELECT count(random_word()) FROM generate_series(1, :rows);
+
+\echo random_text
+SELECT count(random_text()) FROM generate_series(1, :rows);
+
+-- Same expressions as the grants_grant UPDATE of transformers/grants.sql
+\echo grants row
+SELECT count(
+    random_first_name() || random_first_name() || ' ' || random_last_name() || random_email()
+    || random_text() || random_text() || random_text() || random_text() || random_text()
+)
+FROM generate_series(1, :rows);
@@ -0,0 +1,58 @@
+"""
+Check that the CLI starts without importing the cloud and Docker SDKs.
+
+    python benchmarks/startup.py [--budget 0.8] [command ...]
+
+Runs `python -X importtime main.py --help` (or the given command), prints
+the slowest imports and exits with 1 when one of the SDKs was imported or
+the imports took longer than the budget, in seconds.
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+LAZY_PACKAGES = ('boto3', 'botocore', 'azure', 'docker')
+DEFAULT_BUDGET = 0.8
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s+)(?P<module>\S+)$')
+
+
+def import_times(command: list[str]) -> list[tuple[str, int, int]]:
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'main.py', *command],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+    )
+    return [
+        (match['module'], len(match['indent']) // 2, int(match['cumulative']))
+        for match in map(_IMPORT_LINE.match, result.stderr.splitlines())
+        if match
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    parser.add_argument('command', nargs='*', default=['--help'])
+    args = parser.parse_args()
+
+    imports = import_times(args.command)
+    total = sum(cumulative for _, level, cumulative in imports if level == 0) / 1e6
+    for module, _, cumulative in sorted(imports, key=lambda entry: entry[2], reverse=True)[:10]:
+        print(f'{cumulative / 1e3:8.1f} ms  {module}')
+    print(f'{total * 1e3:8.1f} ms  total')
+
+    failures = sorted({module.split('.')[0] for module, _, _ in imports} & set(LAZY_PACKAGES))
+    if failures:
+        print(f"Imported at startup: {', '.join(failures)}")
+    if total > args.budget:
+        print(f"Imports took {total:.2f}s, over the budget of {args.budget:.2f}s")
+
+    sys.exit(1 if failures or total > args.budget else 0)
+
+
+if __name__ == '__main__':
+    main()
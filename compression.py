@@ -0,0 +1,75 @@
+"""
+Streaming compression codecs applied to dumps before they are encrypted.
+"""
+import gzip
+from typing import BinaryIO
+
+import zstandard
+
+CODECS = {
+    'none': 0,
+    'gzip': 1,
+    'zstd': 2,
+}
+DEFAULT_CODEC = 'zstd'
+DEFAULT_LEVELS = {
+    'none': 0,
+    'gzip': 6,
+    'zstd': 3,
+}
+
+
+class _Passthrough:
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def write(self, data) -> int:
+        return self._stream.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def close(self):
+        pass
+
+
+def codec_name(codec_id: int) -> str:
+    for name, value in CODECS.items():
+        if value == codec_id:
+            return name
+
+    raise ValueError(f"Unknown compression codec {codec_id}")
+
+
+def validate_codec(codec: str) -> str:
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression codec {codec!r}, use one of: {', '.join(CODECS)}")
+
+    return codec
+
+
+def compressing_writer(sink: BinaryIO, codec: str, level: int | None = None) -> BinaryIO:
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    match codec:
+        case 'zstd':
+            return zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(sink, closefd=False)
+        case 'gzip':
+            return gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=level)
+        case 'none':
+            return _Passthrough(sink)
+
+    raise ValueError(f"Unknown compression codec {codec!r}")
+
+
+def decompressing_reader(source: BinaryIO, codec: str) -> BinaryIO:
+    match codec:
+        case 'zstd':
+            return zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=False)
+        case 'gzip':
+            return gzip.GzipFile(fileobj=source, mode='rb')
+        case 'none':
+            return source
+
+    raise ValueError(f"Unknown compression codec {codec!r}")
@@ -0,0 +1,333 @@
+"""
+Streaming, chunked authenticated encryption for dump artifacts.
+
+An encrypted artifact is laid out as:
+
+    header: MAGIC (6 bytes) | version (1 byte) | chunk size (4 bytes) | nonce prefix (7 bytes) | compression (1 byte)
+    frames: ciphertext length (4 bytes) | AES-256-GCM ciphertext and tag
+
+Every frame holds at most `chunk size` bytes of plaintext. Its nonce is the
+nonce prefix, a 4 bytes frame counter and a 1 byte "last frame" flag, and the
+header is authenticated as associated data of every frame, so reordered,
+truncated or tampered artifacts fail to decrypt.
+
+The plaintext is compressed with the codec recorded in the header (version 1
+artifacts have no compression byte and are never compressed). Artifacts that
+don't start with MAGIC are legacy whole-file Fernet tokens.
+"""
+import base64
+import hashlib
+import io
+import os
+import shutil
+import struct
+import tarfile
+from contextlib import contextmanager, suppress
+from typing import BinaryIO, Iterator
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from compression import CODECS, codec_name, compressing_writer, decompressing_reader
+
+MAGIC = b'ANONZ\x00'
+VERSION = 2
+CHUNK_SIZE = 1024 * 1024
+
+_HEADER_V1 = struct.Struct('>6sBI7s')
+_COMPRESSION = struct.Struct('>B')
+_FRAME_LENGTH = struct.Struct('>I')
+_TAG_SIZE = 16
+_MAX_FRAMES = 2 ** 32
+
+
+class DecryptionError(Exception):
+    pass
+
+
+def _derive_key(key: str | bytes) -> AESGCM:
+    # ENCRYPTION_KEY is a Fernet key, derive a dedicated AES-256 key from it
+    # so the same secret keeps working for both formats.
+    raw_key = base64.urlsafe_b64decode(key)
+    derived = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'anonymizer-stream-encryption',
+    ).derive(raw_key)
+    return AESGCM(derived)
+
+
+def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    if counter >= _MAX_FRAMES:
+        raise ValueError("Too many frames for a single artifact")
+
+    return prefix + struct.pack('>IB', counter, 1 if last else 0)
+
+
+class EncryptingWriter(io.RawIOBase):
+    def __init__(self, sink: BinaryIO, key: str | bytes, chunk_size: int = CHUNK_SIZE, compression: str = 'none'):
+        self._sink = sink
+        self._aead = _derive_key(key)
+        self._chunk_size = chunk_size
+        self._nonce_prefix = os.urandom(7)
+        self._header = (
+            _HEADER_V1.pack(MAGIC, VERSION, chunk_size, self._nonce_prefix)
+            + _COMPRESSION.pack(CODECS[compression])
+        )
+        self._buffer = bytearray()
+        self._counter = 0
+
+        self._sink.write(self._header)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+
+        self._buffer += data
+
+        # Always keep the tail in the buffer: the last frame is only known
+        # (and flagged as such) on close.
+        while len(self._buffer) > self._chunk_size:
+            self._write_frame(bytes(self._buffer[:self._chunk_size]), last=False)
+            del self._buffer[:self._chunk_size]
+
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._write_frame(bytes(self._buffer), last=True)
+            self._buffer.clear()
+            self._sink.flush()
+
+        super().close()
+
+    def abort(self):
+        """
+        Close without writing the last frame, so that the partial artifact
+        fails to decrypt instead of passing for a complete one.
+        """
+        self._buffer.clear()
+        super().close()
+
+    def _write_frame(self, plaintext: bytes, *, last: bool):
+        nonce = _nonce(self._nonce_prefix, self._counter, last)
+        ciphertext = self._aead.encrypt(nonce, plaintext, self._header)
+        self._sink.write(_FRAME_LENGTH.pack(len(ciphertext)))
+        self._sink.write(ciphertext)
+        self._counter += 1
+
+
+class DecryptingReader(io.RawIOBase):
+    def __init__(self, source: BinaryIO, key: str | bytes):
+        self._source = _Prepended(b'', source)
+        self._aead = _derive_key(key)
+
+        self._header = _read_exactly(self._source, _HEADER_V1.size)
+        magic, version, chunk_size, nonce_prefix = _HEADER_V1.unpack(self._header)
+
+        if magic != MAGIC:
+            raise DecryptionError("Not an encrypted artifact")
+
+        if version == 1:
+            self.compression = 'none'
+        elif version == 2:
+            compression = _read_exactly(self._source, _COMPRESSION.size)
+            self._header += compression
+            self.compression = codec_name(_COMPRESSION.unpack(compression)[0])
+        else:
+            raise DecryptionError(f"Unsupported artifact version {version}")
+
+        self._chunk_size = chunk_size
+        self._nonce_prefix = nonce_prefix
+        self._counter = 0
+        self._finished = False
+        self._pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._finished:
+            self._pending = memoryview(self._read_frame())
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def _read_frame(self) -> bytes:
+        (length,) = _FRAME_LENGTH.unpack(_read_exactly(self._source, _FRAME_LENGTH.size))
+
+        if length > self._chunk_size + _TAG_SIZE:
+            raise DecryptionError("Corrupted artifact: frame larger than chunk size")
+
+        ciphertext = _read_exactly(self._source, length)
+
+        # Peek one byte ahead: only the frame at the end of the stream may
+        # carry the "last frame" flag, which is what detects truncation.
+        next_byte = self._source.read(1)
+        last = not next_byte
+        self._source.unread(next_byte)
+
+        try:
+            plaintext = self._aead.decrypt(
+                _nonce(self._nonce_prefix, self._counter, last),
+                ciphertext,
+                self._header,
+            )
+        except InvalidTag:
+            raise DecryptionError("Corrupted artifact or wrong encryption key")
+
+        self._counter += 1
+        self._finished = last
+        return plaintext
+
+
+class _Prepended(io.RawIOBase):
+    def __init__(self, head: bytes, source: BinaryIO):
+        self._head = head
+        self._source = source
+
+    def readable(self) -> bool:
+        return True
+
+    def unread(self, data: bytes):
+        self._head = data + self._head
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._source.read(size)
+
+        head, self._head = self._head, b''
+        if size is None or size < 0:
+            return head + self._source.read()
+
+        if size <= len(head):
+            self._head = head[size:]
+            return head[:size]
+
+        return head + self._source.read(size - len(head))
+
+
+def _read_exactly(source: BinaryIO, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = source.read(size - len(data))
+        if not chunk:
+            raise DecryptionError("Corrupted artifact: truncated")
+        data += chunk
+
+    return bytes(data)
+
+
+def is_encrypted_artifact(head: bytes) -> bool:
+    return head.startswith(MAGIC)
+
+
+def open_decrypted(source: BinaryIO, key: str | bytes) -> BinaryIO:
+    head = source.read(len(MAGIC))
+    source = _Prepended(head, source)
+
+    if is_encrypted_artifact(head):
+        reader = DecryptingReader(source, key)
+        return decompressing_reader(
+            io.BufferedReader(reader, buffer_size=CHUNK_SIZE),
+            reader.compression,
+        )
+
+    # Legacy artifact: Fernet tokens can only be verified and decrypted whole.
+    return io.BytesIO(Fernet(key).decrypt(source.read()))
+
+
+@contextmanager
+def open_encrypted(
+    sink: BinaryIO,
+    key: str | bytes,
+    *,
+    compression: str = 'none',
+    compression_level: int | None = None,
+) -> Iterator[BinaryIO]:
+    writer = EncryptingWriter(sink, key, compression=compression)
+    try:
+        compressor = compressing_writer(writer, compression, compression_level)
+        yield compressor
+        compressor.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.close()
+
+
+def encrypt_file(source: str, destination: str, key: str | bytes, **options):
+    with _removed_on_error(destination):
+        with open(source, 'rb') as plain_file, open(destination, 'wb') as encrypted_file:
+            with open_encrypted(encrypted_file, key, **options) as stream:
+                shutil.copyfileobj(plain_file, stream, CHUNK_SIZE)
+
+
+@contextmanager
+def _removed_on_error(path: str) -> Iterator[None]:
+    # a partial artifact would only be mistaken for a complete one later
+    try:
+        yield
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+
+
+class _Digesting:
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.digest.update(data)
+        return data
+
+
+def decrypt_file(source: str, destination: str, key: str | bytes) -> str:
+    """
+    Decrypt `source` into `destination`, returning the SHA-256 of the plaintext.
+    """
+    with open(source, 'rb') as encrypted_file, open(destination, 'wb') as plain_file:
+        plain = _Digesting(open_decrypted(encrypted_file, key))
+        shutil.copyfileobj(plain, plain_file, CHUNK_SIZE)
+
+    return plain.digest.hexdigest()
+
+
+def encrypt_directory(source: str, destination: str, key: str | bytes, **options):
+    with _removed_on_error(destination), open(destination, 'wb') as encrypted_file:
+        with open_encrypted(encrypted_file, key, **options) as stream:
+            with tarfile.open(fileobj=stream, mode='w|') as tar:
+                tar.add(source, arcname='.')
+
+
+def decrypt_directory(source: str, destination: str, key: str | bytes) -> str:
+    """
+    Decrypt and extract `source` into `destination`, returning the SHA-256 of
+    the plaintext tar stream.
+    """
+    with open(source, 'rb') as encrypted_file:
+        plain = _Digesting(open_decrypted(encrypted_file, key))
+        with tarfile.open(fileobj=plain, mode='r|') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(destination, filter='data')
+            else:
+                tar.extractall(destination)
+
+        # the tar end of archive padding may not have been read
+        while plain.read(CHUNK_SIZE):
+            pass
+
+    return plain.digest.hexdigest()
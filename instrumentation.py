@@ -0,0 +1,250 @@
+"""
+Timing, throughput and resource usage of the stages of a run.
+
+Stages are recorded as nested spans:
+
+    with span('upload') as upload:
+        upload.add('bytes_in', size)
+
+Every span records its wall time, byte and row counters and the peak RSS of
+this process and of the (waited for) child processes when it ends. Spans
+opened in worker threads are nested under the span that was current when
+the work was submitted, if it was submitted through `propagate`.
+
+The recorded spans can be written as JSON or OpenMetrics text, and shown
+live as a progress display.
+"""
+import contextvars
+import json
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterator
+
+from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+
+if TYPE_CHECKING:
+    from docker.models.containers import Container
+
+COUNTERS = ('bytes_in', 'bytes_out', 'rows')
+FORMATS = ('json', 'openmetrics')
+PROGRESS_INTERVAL = 0.2
+
+_current: contextvars.ContextVar['Span | None'] = contextvars.ContextVar('span', default=None)
+
+
+class Span:
+    def __init__(self, recorder: 'Recorder', id: int, name: str, parent: 'Span | None', attributes: dict):
+        self.id = id
+        self.name = name
+        self.path = f'{parent.path}/{name}' if parent else name
+        self.parent_id = parent.id if parent else None
+        self.attributes = attributes
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.started_at = time.time()
+        self.duration: float | None = None
+        self.peak_rss: int | None = None
+        self.peak_children_rss: int | None = None
+        self._recorder = recorder
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, counter: str, value: int):
+        with self._lock:
+            self.counters[counter] += value
+
+        self._recorder.on_update(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.monotonic() - self._started
+        # ru_maxrss is in kilobytes on Linux
+        self.peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self.peak_children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'path': self.path,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            **self.counters,
+            'peak_rss': self.peak_rss,
+            'peak_children_rss': self.peak_children_rss,
+            'attributes': self.attributes,
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._progress: Progress | None = None
+        self._tasks: dict[int, int] = {}
+        self._refreshed_at: dict[int, float] = {}
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        with self._lock:
+            span = Span(self, len(self.spans), name, _current.get(), attributes)
+            self.spans.append(span)
+
+        token = _current.set(span)
+        if self._progress:
+            self._tasks[span.id] = self._progress.add_task(span.path, total=None, detail='')
+
+        try:
+            yield span
+        except BaseException as error:
+            span.set(error=type(error).__name__)
+            raise
+        finally:
+            span.finish()
+            _current.reset(token)
+            if self._progress and span.id in self._tasks:
+                self._progress.remove_task(self._tasks.pop(span.id))
+
+    def on_update(self, span: Span):
+        if not self._progress or span.id not in self._tasks:
+            return
+
+        now = time.monotonic()
+        if now - self._refreshed_at.get(span.id, 0) < PROGRESS_INTERVAL:
+            return
+
+        self._refreshed_at[span.id] = now
+        detail = ', '.join(f'{counter} {value:,}' for counter, value in span.counters.items() if value)
+        self._progress.update(self._tasks[span.id], detail=detail)
+
+    @contextmanager
+    def live_progress(self) -> Iterator[None]:
+        self._progress = Progress(
+            SpinnerColumn(),
+            TextColumn('{task.description}'),
+            TextColumn('[dim]{task.fields[detail]}'),
+            TimeElapsedColumn(),
+        )
+
+        try:
+            with self._progress:
+                yield
+        finally:
+            self._progress = None
+            self._tasks.clear()
+
+    def to_json(self) -> str:
+        return json.dumps({'spans': [span.as_dict() for span in self.spans]}, indent=2)
+
+    def to_openmetrics(self) -> str:
+        metrics = {
+            'duration_seconds': lambda span: span.duration,
+            'bytes_in': lambda span: span.counters['bytes_in'],
+            'bytes_out': lambda span: span.counters['bytes_out'],
+            'rows': lambda span: span.counters['rows'],
+            'peak_rss_bytes': lambda span: span.peak_rss,
+            'peak_children_rss_bytes': lambda span: span.peak_children_rss,
+        }
+
+        lines = []
+        for metric, value_of in metrics.items():
+            lines.append(f'# TYPE anonymizer_span_{metric} gauge')
+            for span in self.spans:
+                value = value_of(span)
+                if value is not None:
+                    lines.append(f'anonymizer_span_{metric}{{span="{_escape(span.path)}",id="{span.id}"}} {value}')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str, format: str = 'json'):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown metrics format {format!r}, use one of: {', '.join(FORMATS)}")
+
+        with open(path, 'w') as stream:
+            stream.write(self.to_json() if format == 'json' else self.to_openmetrics())
+
+
+RECORDER = Recorder()
+
+
+def span(name: str, **attributes):
+    return RECORDER.span(name, **attributes)
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def propagate(function: Callable) -> Callable:
+    """
+    Wrap `function`, to be run in another thread, so that its spans are
+    nested under the current span.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
+
+
+class _Counted:
+    def __init__(self, stream: BinaryIO, span: Span, counter: str):
+        self._stream = stream
+        self._span = span
+        self._counter = counter
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._span.add(self._counter, len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        size = self._stream.readinto(buffer)
+        self._span.add(self._counter, size or 0)
+        return size
+
+    def readline(self, size: int = -1) -> bytes:
+        line = self._stream.readline(size)
+        self._span.add(self._counter, len(line))
+        return line
+
+    def __iter__(self):
+        for line in self._stream:
+            self._span.add(self._counter, len(line))
+            yield line
+
+    def write(self, data) -> int:
+        self._span.add(self._counter, len(data))
+        return self._stream.write(data)
+
+
+def counted(stream: BinaryIO, counter: str, span: Span | None = None) -> BinaryIO:
+    """
+    Wrap `stream` so that the bytes read from or written to it are added to
+    `counter` of `span` (the current span by default).
+    """
+    span = span or current_span()
+    if span is None:
+        return stream
+
+    return _Counted(stream, span, counter)
+
+
+def container_stats(container: 'Container') -> dict:
+    try:
+        stats = container.stats(stream=False)
+    except Exception:
+        return {}
+
+    memory = stats.get('memory_stats', {})
+    cpu = stats.get('cpu_stats', {}).get('cpu_usage', {})
+    return {
+        'container_memory_bytes': memory.get('max_usage') or memory.get('usage'),
+        'container_cpu_seconds': cpu.get('total_usage', 0) / 1e9,
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,202 @@
+"""
+Helpers to chain pg_dump/psql processes and Python streams without writing
+intermediate files. Data moves through OS pipes, so a slow consumer blocks
+the producer instead of buffering the dump in memory or on disk.
+
+The Postgres client programs run from local binaries when a compatible
+version is installed, and in a one-shot `postgres:{version}` container
+otherwise (client `auto`). The `native` and `docker` clients pin the choice.
+
+Clients work with servers of their own and older major versions, and the
+binaries of the server's version are preferred. pg_dump is the exception: it
+writes SQL for servers of its own version (pg_dump 17 sets
+`transaction_timeout`, which older servers reject), and its dumps are loaded
+into `version` servers, the temporary database included, so only a pg_dump
+of exactly that version is used.
+"""
+import functools
+import io
+import os
+import re
+import shutil
+import subprocess
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+CHUNK_SIZE = 1024 * 1024
+CLIENTS = ('auto', 'native', 'docker')
+DEFAULT_CLIENT = 'auto'
+
+# Where distributions install the client programs of each major version
+NATIVE_FOLDERS = (
+    '/usr/lib/postgresql/{version}/bin',
+    '/usr/pgsql-{version}/bin',
+    '/opt/homebrew/opt/postgresql@{version}/bin',
+    '/usr/local/opt/postgresql@{version}/bin',
+)
+
+_VERSION = re.compile(r'\(PostgreSQL\)\s+(?P<major>\d+)')
+
+
+class PipelineError(Exception):
+    pass
+
+
+def postgres_command(
+    version: int,
+    args: list[str],
+    *,
+    stdin: bool = False,
+    client: str = DEFAULT_CLIENT,
+    volumes: list[str] | None = None,
+) -> list[str]:
+    """
+    Command running the client program `args[0]` against a `version`
+    server. `volumes` are host folders the program reads or writes, mounted
+    at the same path when it runs in a container.
+    """
+    if client not in CLIENTS:
+        raise ValueError(f"Unknown Postgres client {client!r}, use one of: {', '.join(CLIENTS)}")
+
+    if client != 'docker':
+        if binary := native_binary(args[0], version):
+            return [binary, *args[1:]]
+
+        if client == 'native':
+            newer = ' or newer' if args[0] != 'pg_dump' else ''
+            raise PipelineError(f"No local {args[0]} of version {version}{newer} found")
+
+    command = ['docker', 'run', '--rm', '--network=host']
+    if stdin:
+        command.append('--interactive')
+
+    for folder in volumes or []:
+        command += ['--volume', f'{folder}:{folder}']
+
+    return [*command, f'postgres:{version}', *args]
+
+
+def uses_container(program: str, version: int, client: str = DEFAULT_CLIENT) -> bool:
+    return client == 'docker' or (client == 'auto' and native_binary(program, version) is None)
+
+
+@functools.cache
+def native_binary(program: str, version: int) -> str | None:
+    candidates = [os.path.join(folder.format(version=version), program) for folder in NATIVE_FOLDERS]
+    if found := shutil.which(program):
+        candidates.append(found)
+
+    compatible = [
+        candidate for candidate in candidates
+        if os.access(candidate, os.X_OK) and (_major_version(candidate) or 0) >= version
+    ]
+    for candidate in compatible:
+        if _major_version(candidate) == version:
+            return candidate
+
+    if program != 'pg_dump' and compatible:
+        return compatible[0]
+
+    return None
+
+
+@functools.cache
+def _major_version(binary: str) -> int | None:
+    try:
+        output = subprocess.run([binary, '--version'], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    match = _VERSION.search(output)
+    return int(match['major']) if match else None
+
+
+def pull_image(version: int):
+    """
+    Pull the client image unless it is there already, so that concurrent
+    runs don't each pull it.
+    """
+    image = f'postgres:{version}'
+    if subprocess.run(['docker', 'image', 'inspect', image], capture_output=True).returncode != 0:
+        run(['docker', 'pull', '--quiet', image])
+
+
+def run(command: list[str]):
+    _check(command, subprocess.run(command).returncode)
+
+
+def check_output(command: list[str]) -> str:
+    result = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    _check(command, result.returncode)
+    return result.stdout
+
+
+@contextmanager
+def output_of(command: list[str]) -> Iterator[BinaryIO]:
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+
+    try:
+        yield process.stdout
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdout.close()
+
+    _check(command, process.wait())
+
+
+@contextmanager
+def input_of(command: list[str]) -> Iterator[BinaryIO]:
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    try:
+        yield process.stdin
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.stdin.close()
+
+    _check(command, process.wait())
+
+
+class _TeeReader(io.RawIOBase):
+    def __init__(self, source: BinaryIO, copy: BinaryIO):
+        self._source = source
+        self._copy = copy
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self._source.readinto(buffer)
+        if size:
+            self._copy.write(memoryview(buffer)[:size])
+
+        return size
+
+
+def tee_reader(source: BinaryIO, copy: BinaryIO) -> BinaryIO:
+    """
+    Wrap `source` so that everything read from it is also written to `copy`.
+    """
+    return io.BufferedReader(_TeeReader(source, copy), buffer_size=CHUNK_SIZE)
+
+
+class Tee:
+    def __init__(self, *sinks: BinaryIO):
+        self._sinks = sinks
+
+    def write(self, data) -> int:
+        for sink in self._sinks:
+            sink.write(data)
+
+        return len(data)
+
+
+def _check(command: list[str], return_code: int):
+    if return_code != 0:
+        programs = [os.path.basename(arg) for arg in command]
+        program = next((name for name in programs if name.startswith(('pg_', 'psql'))), command[0])
+        raise PipelineError(f"{program} exited with status {return_code}")
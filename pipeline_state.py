@@ -0,0 +1,132 @@
+"""
+State of resumable pipeline runs.
+
+`pipeline --resume` goes through files in `dumps/` and records every stage it
+completes in a state file, with the size and SHA-256 of the files the stage
+wrote. A run started again after a failure skips the stages whose files are
+still there and unchanged, so that a failed upload doesn't read the source
+database a second time. Stages write their files through `output`, which
+hashes them on the way, so the checksum costs no extra read when writing;
+it is only read again to be checked when resuming.
+"""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+DEFAULT_PATH = 'dumps/pipeline-state.json'
+# every stage reads the files of the previous one. Uploads aren't recorded,
+# interrupted ones resume from their uploaded parts
+STAGES = ('dump', 'anonymise')
+READ_SIZE = 1024 * 1024
+
+
+class PipelineState:
+    def __init__(self, path: str, key: str):
+        """
+        `key` identifies the config of the run, the stages recorded for
+        another config are ignored.
+        """
+        self.path = path
+        self.key = key
+        self._stages: dict[str, dict] = {}
+        # signatures of the files written through `output` since the last
+        # completed stage
+        self._written: dict[str, dict] = {}
+
+        try:
+            with open(path) as stream:
+                state = json.load(stream)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if state.get('key') == key:
+            self._stages = state.get('stages', {})
+
+    def is_completed(self, stage: str) -> bool:
+        entry = self._stages.get(stage)
+        if entry is None:
+            return False
+
+        return all(file_signature(path, expected['size']) == expected for path, expected in entry['outputs'].items())
+
+    @contextmanager
+    def output(self, path: str) -> Iterator[BinaryIO]:
+        """
+        Open `path` for writing by a stage, recording its signature once
+        it is closed.
+        """
+        self._written.pop(path, None)
+        with open(path, 'wb') as stream:
+            hashed = _Hashed(stream)
+            yield hashed
+
+        self._written[path] = {'size': hashed.size, 'sha256': hashed.digest.hexdigest()}
+
+    def complete(self, stage: str, outputs: list[str]):
+        """
+        Record `stage` as completed with the `outputs` it wrote through
+        `output`.
+        """
+        # the later stages worked on the previous outputs of this one
+        for later in STAGES[STAGES.index(stage) + 1:]:
+            self._stages.pop(later, None)
+
+        self._stages[stage] = {
+            'completed_at': time.time(),
+            'outputs': {path: self._written.pop(path) for path in outputs},
+        }
+        self._save()
+
+    def clear(self):
+        self._stages = {}
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        # written aside then renamed, an interrupted run never leaves half a state
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w') as stream:
+            json.dump({'key': self.key, 'stages': self._stages}, stream, indent=2)
+        os.replace(temporary_path, self.path)
+
+
+def config_key(config: dict) -> str:
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def file_signature(path: str, expected_size: int | None = None) -> dict | None:
+    """
+    Size and SHA-256 of `path`, None when it is missing. A file of another
+    size than `expected_size` isn't read.
+    """
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return None
+
+    if expected_size is not None and size != expected_size:
+        return {'size': size}
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stream:
+        while data := stream.read(READ_SIZE):
+            digest.update(data)
+
+    return {'size': size, 'sha256': digest.hexdigest()}
+
+
+class _Hashed:
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self._stream.write(data)
@@ -0,0 +1,128 @@
+"""
+Size report of the source tables, read from the catalog before dumping.
+
+The `skip` rules of a config are shell-style patterns (`social_auth_*`)
+matched against `table` and `schema.table`. With `skip_large_tables`, the
+data of every table over `max_size` is skipped too, unless the table matches
+one of the `allow` patterns. Skipped tables keep their schema, only their
+rows are left out of the dump.
+"""
+import json
+from fnmatch import fnmatchcase
+
+from rich import print
+from rich.table import Table
+
+# Heap and TOAST size, without indexes, is about what the table weighs in the
+# dump; the total size is what it takes once restored
+SIZE_QUERY = '''
+SELECT coalesce(json_agg(json_build_object(
+    'schema', n.nspname,
+    'name', c.relname,
+    'rows', c.reltuples::bigint,
+    'data_size', pg_table_size(c.oid),
+    'total_size', pg_total_relation_size(c.oid)
+)), '[]')
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind = 'r'
+  AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+  AND n.nspname NOT LIKE 'pg\\_%'
+'''
+
+DEFAULT_REPORT_LIMIT = 20
+
+
+class TableSize:
+    def __init__(self, schema: str, name: str, rows: int, data_size: int, total_size: int):
+        self.schema = schema
+        self.name = name
+        # -1 until the table is first analysed
+        self.rows = rows if rows >= 0 else None
+        self.data_size = data_size
+        self.total_size = total_size
+        self.skip_reason: str | None = None
+
+    @property
+    def qualified_name(self) -> str:
+        return f'{self.schema}.{self.name}'
+
+    @property
+    def pattern(self) -> str:
+        return table_pattern(self.schema, self.name)
+
+    def matches(self, patterns: list[str]) -> bool:
+        return any(fnmatchcase(self.name, pattern) or fnmatchcase(self.qualified_name, pattern) for pattern in patterns)
+
+
+def table_pattern(schema: str, name: str) -> str:
+    # quoted, so pg_dump matches the name exactly
+    return '.'.join('"' + part.replace('"', '""') + '"' for part in (schema, name))
+
+
+def parse_sizes(output: str) -> list[TableSize]:
+    return [TableSize(**table) for table in json.loads(output)]
+
+
+def plan(
+    tables: list[TableSize],
+    skip: list[str],
+    *,
+    max_size: int | None = None,
+    allow: list[str] | None = None,
+) -> list[TableSize]:
+    """
+    Set the `skip_reason` of the tables whose data isn't dumped and return
+    them.
+    """
+    for table in tables:
+        if table.matches(skip):
+            table.skip_reason = 'skip rule'
+        elif max_size is not None and table.data_size > max_size and not table.matches(allow or []):
+            table.skip_reason = f'over {format_size(max_size)}'
+
+    return [table for table in tables if table.skip_reason]
+
+
+def report(tables: list[TableSize], *, limit: int | None = DEFAULT_REPORT_LIMIT):
+    """
+    Print the skipped tables and the largest dumped ones, with the estimated
+    size of the dump.
+    """
+    tables = sorted(tables, key=lambda table: table.data_size, reverse=True)
+    dumped = [table for table in tables if not table.skip_reason]
+    dump_size = sum(table.data_size for table in dumped)
+    shown = [table for table in tables if table.skip_reason] + dumped[:limit]
+
+    summary = Table(title='Source tables')
+    for column in ('Table', 'Rows', 'Data', 'With indexes', 'Share of dump', 'Data dumped'):
+        summary.add_column(column, justify='left' if column == 'Table' else 'right')
+
+    for table in sorted(shown, key=lambda table: table.data_size, reverse=True):
+        summary.add_row(
+            table.qualified_name,
+            f'{table.rows:,}' if table.rows is not None else '?',
+            format_size(table.data_size),
+            format_size(table.total_size),
+            f'{table.data_size / dump_size:.1%}' if dump_size and not table.skip_reason else '',
+            f'[yellow]no ({table.skip_reason})[/yellow]' if table.skip_reason else 'yes',
+        )
+
+    print(summary)
+    if len(shown) < len(tables):
+        print(f"=> {len(tables) - len(shown)} smaller table(s) not shown")
+
+    skipped_size = sum(table.data_size for table in tables if table.skip_reason)
+    print(
+        f"=> Estimated dump size: {format_size(dump_size)} of table data, "
+        f"{format_size(skipped_size)} skipped in {len(tables) - len(dumped)} table(s)"
+    )
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+    return f'{size:.1f} TB'
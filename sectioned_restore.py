@@ -0,0 +1,197 @@
+"""
+Restore plain dumps section by section.
+
+pg_dump writes the entries of a plain dump in three sections: pre-data (the
+schema), data (COPY blocks and sequence values) and post-data (indexes,
+constraints, triggers...). The first two are streamed through a single
+session. Post-data is where most of the replay time goes, so its index and
+constraint builds are spread over several sessions:
+
+- indexes and primary key, unique and check constraints, which only lock
+  their own table and can't deadlock each other;
+- then foreign keys, grouped by the tables they connect, so that two
+  sessions never lock the same tables in a different order;
+- then everything else (triggers, rules, comments, ACLs...) in dump order.
+
+The builds are balanced over the sessions by the size of the data of their
+tables, as measured while the data section is loaded.
+"""
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable
+
+from rich import print
+
+from instrumentation import propagate, span
+from pipeline import input_of
+
+# Sessions only ever load data or build indexes, they don't need to wait for
+# every commit to be flushed
+SESSION_SETTINGS = {
+    'synchronous_commit': 'off',
+    'maintenance_work_mem': '512MB',
+}
+
+POST_DATA_TYPES = {
+    b'INDEX', b'CONSTRAINT', b'FK CONSTRAINT', b'TRIGGER', b'RULE', b'POLICY', b'ROW SECURITY', b'INDEX ATTACH',
+    b'STATISTICS', b'EVENT TRIGGER', b'MATERIALIZED VIEW DATA', b'PUBLICATION TABLE', b'PUBLICATION TABLES IN SCHEMA',
+}
+INDEX_TYPES = {b'INDEX', b'CONSTRAINT'}
+FOREIGN_KEY_TYPES = {b'FK CONSTRAINT'}
+
+_HEADER = re.compile(rb'^-- (?:Data for )?Name: .*; Type: (?P<type>[^;]+); Schema: ', re.MULTILINE)
+_CONNECT = re.compile(rb'''^\\connect (?:-reuse-previous=on )?(?:"dbname='(?P<quoted>(?:[^']|'')*)'"|(?P<name>\S+))''')
+_DATA_TABLE = re.compile(rb'^(?:COPY|INSERT INTO) (?P<table>\S+)')
+_TABLES = re.compile(rb'(?:\bALTER TABLE (?:ONLY )?|\bINDEX \S+ ON (?:ONLY )?|\bREFERENCES )(?P<table>[^\s(]+)')
+# psql meta-commands that only make sense in the session that read the whole dump
+_RESTRICT = re.compile(rb'^\\(?:un)?restrict .*\n?', re.MULTILINE)
+
+
+class PostDataEntry:
+    def __init__(self, type: bytes, text: bytes):
+        self.type = type
+        self.text = text
+        self.tables = {match['table'] for match in _TABLES.finditer(text)}
+
+
+def restore_sectioned(
+    source: BinaryIO,
+    psql: Callable[[str | None], list[str]],
+    *,
+    dbname: str,
+    jobs: int,
+    settings: dict[str, str] | None = None,
+):
+    """
+    Restore the plain dump `source`. `psql(dbname)` is a psql command
+    reading statements from stdin, connected to `dbname` or, for `None`, to
+    the database the dump creates its database from.
+    """
+    settings = {**SESSION_SETTINGS, **(settings or {})}
+
+    with span('pre-data and data'):
+        preamble, post_data, data_sizes, dumped_dbname = load_data(source, psql(None), settings)
+
+    entries = parse_post_data(post_data)
+    indexes = [entry for entry in entries if entry.type in INDEX_TYPES]
+    foreign_keys = [entry for entry in entries if entry.type in FOREIGN_KEY_TYPES]
+    others = [entry for entry in entries if entry.type not in INDEX_TYPES | FOREIGN_KEY_TYPES]
+
+    command = psql(dumped_dbname or dbname)
+    header = preamble + session_settings(settings)
+
+    print(f"=> Building {len(indexes)} index(es) and {len(foreign_keys)} foreign key(s) over up to {jobs} session(s)")
+    with span('post-data', entries=len(entries)):
+        for name, groups in (('indexes', [[entry] for entry in indexes]), ('foreign keys', group_by_tables(foreign_keys))):
+            with span(name):
+                scripts = balance(groups, data_sizes, jobs)
+                with ThreadPoolExecutor(max_workers=max(len(scripts), 1)) as executor:
+                    for future in [executor.submit(propagate(run_script), command, header + script) for script in scripts]:
+                        future.result()
+
+        if others:
+            with span('others'):
+                run_script(command, header + b''.join(entry.text for entry in others))
+
+
+def load_data(
+    source: BinaryIO, command: list[str], settings: dict[str, str]
+) -> tuple[bytes, bytes, dict[bytes, int], str | None]:
+    """
+    Stream the pre-data and data sections of `source` to `command`. Returns
+    the session settings of the dump, the post-data section, the size of the
+    data of every table and the name of the database the dump connects to.
+    """
+    preamble = []
+    post_data = []
+    data_sizes: dict[bytes, int] = defaultdict(int)
+    dbname = None
+    table = None
+    seen_header = False
+
+    with input_of(command) as sink:
+        sink.write(session_settings(settings))
+
+        for line in source:
+            if line.startswith(b'-- ') and (header := _HEADER.match(line)):
+                seen_header = True
+                table = None
+                if header['type'] in POST_DATA_TYPES:
+                    post_data.append(line)
+                    break
+            elif not seen_header and line.startswith((b'SET ', b'SELECT pg_catalog.set_config(')):
+                preamble.append(line)
+            elif line.startswith((b'COPY ', b'INSERT INTO ')) and (match := _DATA_TABLE.match(line)):
+                table = match['table']
+
+            if table:
+                data_sizes[table] += len(line)
+
+            sink.write(line)
+
+            if line.startswith(b'\\connect ') and (match := _CONNECT.match(line)):
+                dbname = (match['quoted'].replace(b"''", b"'") if match['quoted'] else match['name']).decode()
+                # settings only last for the session, reconnecting resets them
+                sink.write(session_settings(settings))
+
+    post_data.extend(source)
+    return b''.join(preamble), b''.join(post_data), data_sizes, dbname
+
+
+def parse_post_data(post_data: bytes) -> list[PostDataEntry]:
+    post_data = _RESTRICT.sub(b'', post_data)
+    headers = list(_HEADER.finditer(post_data))
+    if not headers:
+        return [PostDataEntry(b'', post_data)] if post_data.strip() else []
+
+    entries = [PostDataEntry(b'', post_data[:headers[0].start()])]
+    for header, next_header in zip(headers, headers[1:] + [None]):
+        end = next_header.start() if next_header else len(post_data)
+        entries.append(PostDataEntry(header['type'], post_data[header.start():end]))
+
+    return entries
+
+
+def group_by_tables(entries: list[PostDataEntry]) -> list[list[PostDataEntry]]:
+    """
+    Group `entries` so that entries sharing a table, directly or through
+    other entries, are in the same group.
+    """
+    groups: list[tuple[set[bytes], list[PostDataEntry]]] = []
+    for entry in entries:
+        tables = set(entry.tables)
+        members = [entry]
+        for group in [group for group in groups if group[0] & tables]:
+            groups.remove(group)
+            tables |= group[0]
+            members = group[1] + members
+        groups.append((tables, members))
+
+    return [members for _, members in groups]
+
+
+def balance(groups: list[list[PostDataEntry]], data_sizes: dict[bytes, int], jobs: int) -> list[bytes]:
+    """
+    Split `groups` in at most `jobs` scripts of about the same amount of
+    table data, largest groups first.
+    """
+    def weight(group: list[PostDataEntry]) -> int:
+        return sum(data_sizes.get(table, 0) for table in set().union(*(entry.tables for entry in group))) + 1
+
+    scripts: list[tuple[int, list[bytes]]] = [(0, []) for _ in range(min(max(jobs, 1), len(groups)))]
+    for group in sorted(groups, key=weight, reverse=True):
+        index = min(range(len(scripts)), key=lambda index: scripts[index][0])
+        size, texts = scripts[index]
+        scripts[index] = (size + weight(group), texts + [entry.text for entry in group])
+
+    return [b''.join(texts) for _, texts in scripts]
+
+
+def session_settings(settings: dict[str, str]) -> bytes:
+    return b''.join(f"SET {name} = '{value}';\n".encode() for name, value in settings.items())
+
+
+def run_script(command: list[str], script: bytes):
+    with input_of(command) as sink:
+        sink.write(script)
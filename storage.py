@@ -0,0 +1,297 @@
+"""
+Parallel, resumable transfers between local files and object storage.
+
+Both backends only implement a few primitives (HEAD, ranged GET and
+multipart PUT) and share the transfer engine: files are split in parts that
+are transferred concurrently and written to (or read from) disk directly at
+their offset. Progress is tracked in a part manifest next to the local file,
+so an interrupted transfer restarts from the parts that are still missing.
+
+The backends live in their own modules (`storage_s3.py`, `storage_azure.py`)
+and are loaded by name with `load_backend`.
+"""
+import importlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Iterator, NamedTuple
+
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+READ_CHUNK_SIZE = 1024 * 1024
+
+# The SDK of a backend is only imported when it is used
+BACKENDS = {
+    's3': 'storage_s3.S3Storage',
+    'azure': 'storage_azure.AzureStorage',
+}
+
+
+class RemoteObject(NamedTuple):
+    size: int
+    etag: str
+
+
+class Storage:
+    max_parts = 10_000
+
+    def __init__(self, *, part_size: int = DEFAULT_PART_SIZE, concurrency: int = DEFAULT_CONCURRENCY):
+        self.part_size = part_size
+        self.concurrency = concurrency
+
+    def head(self, key: str) -> RemoteObject:
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, end: int, etag: str) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def create_upload(self, key: str) -> str:
+        raise NotImplementedError
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        raise NotImplementedError
+
+    def complete_upload(self, key: str, upload_id: str, parts: list[str]):
+        raise NotImplementedError
+
+    def abort_upload(self, key: str, upload_id: str):
+        raise NotImplementedError
+
+    def download(self, key: str, destination: str) -> RemoteObject:
+        remote = self.head(key)
+        manifest_file = f'{destination}.parts'
+        manifest = _load_manifest(manifest_file)
+
+        resumable = (
+            manifest.get('key') == key
+            and manifest.get('etag') == remote.etag
+            and manifest.get('size') == remote.size
+            and os.path.exists(destination)
+            and os.path.getsize(destination) == remote.size
+        )
+
+        if not resumable:
+            manifest = {
+                'key': key,
+                'etag': remote.etag,
+                'size': remote.size,
+                'part_size': self._part_size_for(remote.size),
+                'completed': {},
+            }
+            with open(destination, 'wb') as file:
+                file.truncate(remote.size)
+            _save_manifest(manifest_file, manifest)
+
+        part_size = manifest['part_size']
+        ranges = _split(remote.size, part_size)
+        missing = [number for number in range(len(ranges)) if str(number) not in manifest['completed']]
+
+        fd = os.open(destination, os.O_WRONLY)
+        try:
+            def fetch(number: int) -> str:
+                start, end = ranges[number]
+                offset = start
+                for chunk in self.read_range(key, start, end, remote.etag):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+
+                if offset != end:
+                    raise IOError(f"Short read on part {number} of {key}")
+
+                return ''
+
+            self._run_parts(missing, fetch, manifest, manifest_file)
+        finally:
+            os.close(fd)
+
+        os.remove(manifest_file)
+        return remote
+
+    def upload(self, source: str, key: str):
+        size = os.path.getsize(source)
+        manifest_file = f'{source}.upload-parts'
+        manifest = _load_manifest(manifest_file)
+
+        if not self.can_resume_upload(source, key):
+            manifest = {
+                'key': key,
+                'size': size,
+                'mtime': os.path.getmtime(source),
+                'part_size': self._part_size_for(size),
+                'upload_id': self.create_upload(key),
+                'completed': {},
+            }
+            _save_manifest(manifest_file, manifest)
+
+        upload_id = manifest['upload_id']
+        ranges = _split(size, manifest['part_size']) or [(0, 0)]
+        missing = [number for number in range(len(ranges)) if str(number) not in manifest['completed']]
+
+        with open(source, 'rb') as file:
+            file_lock = threading.Lock()
+
+            def send(number: int) -> str:
+                start, end = ranges[number]
+                with file_lock:
+                    file.seek(start)
+                    data = file.read(end - start)
+
+                return self.upload_part(key, upload_id, number, data)
+
+            self._run_parts(missing, send, manifest, manifest_file)
+
+        completed = manifest['completed']
+        self.complete_upload(key, upload_id, [completed[str(number)] for number in range(len(ranges))])
+        os.remove(manifest_file)
+
+    def can_resume_upload(self, source: str, key: str) -> bool:
+        manifest = _load_manifest(f'{source}.upload-parts')
+        return (
+            manifest.get('key') == key
+            and os.path.exists(source)
+            and manifest.get('size') == os.path.getsize(source)
+            and manifest.get('mtime') == os.path.getmtime(source)
+        )
+
+    def _part_size_for(self, size: int) -> int:
+        part_size = self.part_size
+        while size > part_size * self.max_parts:
+            part_size *= 2
+
+        return part_size
+
+    def _run_parts(self, numbers: list[int], transfer, manifest: dict, manifest_file: str):
+        if not numbers:
+            return
+
+        manifest_lock = threading.Lock()
+
+        def run(number: int):
+            token = transfer(number)
+            with manifest_lock:
+                manifest['completed'][str(number)] = token
+                _save_manifest(manifest_file, manifest)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(run, number) for number in numbers]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in pending:
+                future.cancel()
+
+            for future in done:
+                future.result()
+
+
+class MultipartWriter(io.RawIOBase):
+    """
+    File-like object uploading whatever is written to it as a multipart
+    upload. At most `concurrency` parts are buffered or in flight: writes
+    block until a slot frees up, which pushes back on the producer.
+    """
+
+    def __init__(self, storage: Storage, key: str):
+        self._storage = storage
+        self._key = key
+        self._upload_id = storage.create_upload(key)
+        self._executor = ThreadPoolExecutor(max_workers=storage.concurrency)
+        self._slots = threading.BoundedSemaphore(storage.concurrency)
+        self._futures = []
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+
+        self._buffer += data
+        part_size = self._storage.part_size
+
+        while len(self._buffer) >= part_size:
+            self._submit(bytes(self._buffer[:part_size]))
+            del self._buffer[:part_size]
+
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            if self._buffer or not self._futures:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+
+            parts = [future.result() for future in self._futures]
+            self._storage.complete_upload(self._key, self._upload_id, parts)
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+    def abort(self):
+        if self.closed:
+            return
+
+        for future in self._futures:
+            future.cancel()
+
+        self._executor.shutdown()
+        self._storage.abort_upload(self._key, self._upload_id)
+        super().close()
+
+    def _submit(self, data: bytes):
+        if len(self._futures) >= self._storage.max_parts:
+            raise IOError(f"Upload of {self._key} exceeds {self._storage.max_parts} parts, increase the part size")
+
+        for future in self._futures:
+            if future.done() and future.exception():
+                raise future.exception()
+
+        self._slots.acquire()
+        number = len(self._futures)
+        self._futures.append(self._executor.submit(self._send, number, data))
+
+    def _send(self, number: int, data: bytes) -> str:
+        try:
+            return self._storage.upload_part(self._key, self._upload_id, number, data)
+        finally:
+            self._slots.release()
+
+
+def load_backend(name: str) -> type[Storage]:
+    try:
+        module, cls = BACKENDS[name].rsplit('.', 1)
+    except KeyError:
+        raise ValueError(f"Unknown storage backend {name!r}, use one of: {', '.join(BACKENDS)}") from None
+
+    return getattr(importlib.import_module(module), cls)
+
+
+def _split(size: int, part_size: int) -> list[tuple[int, int]]:
+    return [
+        (start, min(start + part_size, size))
+        for start in range(0, size, part_size)
+    ]
+
+
+def _load_manifest(path: str) -> dict:
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(path: str, manifest: dict):
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as stream:
+        json.dump(manifest, stream)
+
+    os.replace(temporary_path, path)
@@ -0,0 +1,61 @@
+"""
+Azure Blob Storage backend.
+"""
+import base64
+import os
+from typing import Iterator
+
+from azure.core import MatchConditions
+from azure.identity import DefaultAzureCredential
+from azure.storage.blob import BlobBlock, BlobServiceClient
+
+from storage import RemoteObject, Storage
+
+
+class AzureStorage(Storage):
+    max_parts = 50_000
+
+    def __init__(self, account: str, *, container: str = 'data', endpoint_url: str | None = None, **kwargs):
+        super().__init__(**kwargs)
+
+        # Azurite (and any other emulator) is reached through a connection string
+        if connection_string := os.environ.get('AZURE_STORAGE_CONNECTION_STRING'):
+            service_client = BlobServiceClient.from_connection_string(connection_string)
+        else:
+            account_url = endpoint_url or f"https://{account}.blob.core.windows.net"
+            service_client = BlobServiceClient(account_url, credential=DefaultAzureCredential())
+
+        self.container_client = service_client.get_container_client(container)
+
+    def head(self, key: str) -> RemoteObject:
+        properties = self.container_client.get_blob_client(key).get_blob_properties()
+        return RemoteObject(size=properties.size, etag=properties.etag)
+
+    def read_range(self, key: str, start: int, end: int, etag: str) -> Iterator[bytes]:
+        downloader = self.container_client.get_blob_client(key).download_blob(
+            offset=start,
+            length=end - start,
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified,
+            max_concurrency=1,
+        )
+        yield from downloader.chunks()
+
+    def create_upload(self, key: str) -> str:
+        # Uncommitted blocks are kept by the service for a week and don't
+        # need an upload session.
+        return ''
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        block_id = base64.b64encode(f'{number:08d}'.encode()).decode()
+        self.container_client.get_blob_client(key).stage_block(block_id, data, length=len(data))
+        return block_id
+
+    def complete_upload(self, key: str, upload_id: str, parts: list[str]):
+        self.container_client.get_blob_client(key).commit_block_list(
+            [BlobBlock(block_id=block_id) for block_id in parts]
+        )
+
+    def abort_upload(self, key: str, upload_id: str):
+        # Uncommitted blocks are garbage collected by the service
+        pass
@@ -0,0 +1,60 @@
+"""
+Amazon S3 (and S3 compatible) storage backend.
+"""
+from typing import Iterator
+
+import boto3
+
+from storage import READ_CHUNK_SIZE, RemoteObject, Storage
+
+
+class S3Storage(Storage):
+    def __init__(self, bucket: str, *, endpoint_url: str | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        # the default session isn't thread-safe, and services restored
+        # concurrently each create their storage
+        self.client = boto3.session.Session().client('s3', endpoint_url=endpoint_url)
+
+    def head(self, key: str) -> RemoteObject:
+        response = self.client.head_object(Bucket=self.bucket, Key=key)
+        return RemoteObject(size=response['ContentLength'], etag=response['ETag'])
+
+    def read_range(self, key: str, start: int, end: int, etag: str) -> Iterator[bytes]:
+        response = self.client.get_object(
+            Bucket=self.bucket,
+            Key=key,
+            Range=f'bytes={start}-{end - 1}',
+            IfMatch=etag,
+        )
+        yield from response['Body'].iter_chunks(READ_CHUNK_SIZE)
+
+    def create_upload(self, key: str) -> str:
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)
+        return response['UploadId']
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            PartNumber=number + 1,
+            Body=data,
+        )
+        return response['ETag']
+
+    def complete_upload(self, key: str, upload_id: str, parts: list[str]):
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [
+                    {'ETag': etag, 'PartNumber': number + 1}
+                    for number, etag in enumerate(parts)
+                ]
+            },
+        )
+
+    def abort_upload(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
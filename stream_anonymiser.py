@@ -0,0 +1,479 @@
+"""
+Anonymise a plain pg_dump output on the fly, without restoring it.
+
+The dump has to use COPY statements for its data (the default pg_dump
+format). Rows of tables that have column rules are rewritten as they stream
+through, everything else is copied unchanged, so memory use is bounded by
+the longest line of the dump.
+
+Rules are declared in the service config as `table.column: rule`, where rule
+is the name of a generator (mirroring the functions in
+transformers/functions.sql) or `{value: ...}` for a constant:
+
+    columns:
+      users.email: email
+      users.password:
+        value: '!'
+    only_rows:
+      users:
+        is_staff: false
+
+Projections shrink heavy columns in every row, whatever `only_rows` says:
+
+    projections:
+      submissions_submission.abstract:
+        truncate: 200      # at most 200 bytes
+      files_file.content:
+        placeholder: 16    # 16 bytes of filler
+      logs_entry.payload: null
+      logs_entry.details: default
+
+`default` leaves the column out of the COPY statement, so it is loaded with
+its default value (or NULL).
+"""
+import datetime
+import hashlib
+import io
+import random
+import re
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+from sectioned_restore import POST_DATA_TYPES
+from table_cache import TableCache, cache_key
+
+FUNCTIONS_FILE = Path(__file__).parent / 'transformers' / 'functions.sql'
+
+NULL = b'\\N'
+END_OF_COPY = b'\\.'
+# bytea in hex format, with its backslash escaped
+BYTEA_PREFIX = b'\\\\x'
+SPOOL_SIZE = 64 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+_COPY_STATEMENT = re.compile(rb'^COPY (?P<table>\S+) \((?P<columns>.*)\) FROM stdin;$')
+_IDENTIFIER = re.compile(rb'"(?:[^"]|"")*"|[^,\s]+')
+_ENTRY_HEADER = re.compile(rb'^-- (?:Data for )?Name: .*; Type: (?P<type>[^;]+); Schema: ')
+_CREATE_FUNCTION = re.compile(r'CREATE (?:OR REPLACE )?FUNCTION ')
+_ARRAY_FUNCTION = re.compile(r'(?P<name>\w+)\(\).*?array\[(?P<values>.*?)\]', re.DOTALL)
+_SQL_STRING = re.compile(r"'((?:[^']|'')*)'")
+_COPY_ESCAPES = {
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+}
+
+
+class RuleError(Exception):
+    pass
+
+
+def load_dictionaries(functions_file: Path = FUNCTIONS_FILE) -> dict[str, list[str]]:
+    # The word lists live in transformers/functions.sql, so both engines
+    # draw fake values from the same dictionaries.
+    dictionaries = {}
+    for function in _CREATE_FUNCTION.split(functions_file.read_text())[1:]:
+        if match := _ARRAY_FUNCTION.match(function):
+            values = _SQL_STRING.findall(match['values'])
+            dictionaries[match['name']] = [value.replace("''", "'") for value in values]
+
+    return dictionaries
+
+
+class Generators:
+    # the generators a rule can name, `get` refuses any other attribute
+    NAMES = ('first_name', 'last_name', 'full_name', 'username', 'email', 'date_of_birth', 'word', 'text')
+
+    def __init__(self, dictionaries: dict[str, list[str]], seed: int | None = None):
+        self.fingerprint = cache_key(repr(sorted(dictionaries.items())).encode())
+        self._random = random.Random(seed)
+        self._first_names = dictionaries['fake_first_names']
+        self._last_names = dictionaries['fake_last_names']
+        self._words = dictionaries['fake_words']
+
+    def first_name(self) -> str:
+        return self._random.choice(self._first_names)
+
+    def last_name(self) -> str:
+        return self._random.choice(self._last_names)
+
+    def full_name(self) -> str:
+        return f'{self.first_name()} {self.last_name()}'
+
+    def username(self) -> str:
+        return hashlib.md5(self._random.randbytes(16)).hexdigest()
+
+    def email(self) -> str:
+        return f'{self.username()}@fake.com'
+
+    def date_of_birth(self) -> str:
+        start = datetime.date(1950, 1, 10)
+        end = datetime.date(2005, 1, 20)
+        return (start + datetime.timedelta(days=self._random.randrange((end - start).days))).isoformat()
+
+    def word(self) -> str:
+        return self._random.choice(self._words)
+
+    def text(self) -> str:
+        return ' '.join(self.word() for _ in range(5))
+
+    def get(self, name: str) -> Callable[[], str]:
+        if name not in self.NAMES:
+            raise RuleError(f"Unknown generator {name!r}, use one of: {', '.join(self.NAMES)}")
+
+        return getattr(self, name)
+
+
+def _copy_literal(value: object) -> bytes:
+    if value is None:
+        return NULL
+
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+
+    text = str(value)
+    for character, escaped in _COPY_ESCAPES.items():
+        text = text.replace(character, escaped)
+
+    return text.encode()
+
+
+def _unquote_identifier(identifier: bytes) -> str:
+    name = identifier.decode()
+    if name.startswith('"') and name.endswith('"'):
+        return name[1:-1].replace('""', '"')
+
+    return name
+
+
+def _truncate(field: bytes, size: int) -> bytes:
+    if field.startswith(BYTEA_PREFIX):
+        # two hex digits per byte
+        return field[:len(BYTEA_PREFIX) + 2 * size]
+
+    if field == NULL or len(field) <= size:
+        return field
+
+    # drop a character cut in half, then an escape sequence cut in half
+    truncated = field[:size].decode('utf-8', 'ignore').encode()
+    if (len(truncated) - len(truncated.rstrip(b'\\'))) % 2:
+        truncated = truncated[:-1]
+
+    return truncated
+
+
+def _placeholder(field: bytes, size: int) -> bytes:
+    if field == NULL:
+        return field
+
+    if field.startswith(BYTEA_PREFIX):
+        return BYTEA_PREFIX + b'00' * size
+
+    return b'x' * size
+
+
+def _table_name(qualified_name: bytes) -> str:
+    return _schema_and_table(qualified_name)[1]
+
+
+def _schema_and_table(qualified_name: bytes) -> tuple[str | None, str]:
+    parts = [_unquote_identifier(part) for part in re.findall(rb'"(?:[^"]|"")*"|[^.]+', qualified_name)]
+    return (parts[-2] if len(parts) > 1 else None), parts[-1]
+
+
+class StreamAnonymiser:
+    def __init__(
+        self,
+        columns: dict[str, str | dict],
+        only_rows: dict[str, dict[str, object]] | None = None,
+        *,
+        projections: dict[str, str | dict | None] | None = None,
+        generators: Generators | None = None,
+        cache: TableCache | None = None,
+    ):
+        self._generators = generators or Generators(load_dictionaries())
+        self._cache = cache
+        # a None rule leaves the column out
+        self._rules: dict[str, dict[str, Callable[[bytes], bytes] | None]] = {}
+        self._projections: dict[str, dict[str, Callable[[bytes], bytes] | None]] = {}
+        self._specs: dict[str, dict[str, object]] = {}
+        # by schema and table, from `splice_unchanged`
+        self._fingerprint_keys: dict[tuple[str, str], str] = {}
+        self._spliced: dict[tuple[str, str], BinaryIO] = {}
+        self.reused_tables: list[str] = []
+        self._only_rows = {
+            table: {column: _copy_literal(value) for column, value in conditions.items()}
+            for table, conditions in (only_rows or {}).items()
+        }
+
+        for target, rule in columns.items():
+            table, _, column = target.rpartition('.')
+            if not table:
+                raise RuleError(f"Column rule {target!r} must be written as table.column")
+
+            compiled = self._compile(target, rule)
+            if compiled is None and table in self._only_rows:
+                raise RuleError(f"Column rule {target!r} leaves the column out, it can't be combined with only_rows")
+
+            self._rules.setdefault(table, {})[column] = compiled
+            self._specs.setdefault(table, {})[column] = rule
+
+        for target, rule in (projections or {}).items():
+            table, _, column = target.rpartition('.')
+            if not table:
+                raise RuleError(f"Projection {target!r} must be written as table.column")
+
+            self._projections.setdefault(table, {})[column] = self._compile(target, rule)
+            self._specs.setdefault(table, {})[f'projection {column}'] = rule
+
+    def _compile(self, target: str, rule: str | dict | None) -> Callable[[bytes], bytes] | None:
+        if rule is None or rule == 'null':
+            return lambda field: NULL
+
+        if rule == 'default':
+            return None
+
+        if isinstance(rule, str):
+            generator = self._generators.get(rule)
+            return lambda field: _copy_literal(generator())
+
+        if isinstance(rule, dict) and 'value' in rule:
+            literal = _copy_literal(rule['value'])
+            return lambda field: literal
+
+        if isinstance(rule, dict) and 'truncate' in rule:
+            size = int(rule['truncate'])
+            return lambda field: _truncate(field, size)
+
+        if isinstance(rule, dict) and 'placeholder' in rule:
+            size = int(rule['placeholder'])
+            return lambda field: _placeholder(field, size)
+
+        raise RuleError(f"Invalid rule for {target!r}: {rule!r}")
+
+    @property
+    def tables(self) -> list[str]:
+        """
+        The tables with rules, whose anonymised data can be cached.
+        """
+        return sorted(self._specs) if self._cache else []
+
+    def splice_unchanged(self, fingerprints: dict[tuple[str, str], bytes]) -> list[tuple[str, str]]:
+        """
+        Look the tables up in the cache by the fingerprints they had before
+        the dump, and return the ones found. Their data must be left out of
+        the dump, the cached data is spliced into it instead. The data of
+        the others is stored under their fingerprint as it streams through.
+        """
+        for (schema, table), fingerprint in fingerprints.items():
+            key = cache_key(b'fingerprint', fingerprint, self._rules_key(table))
+            # opened now, so that the entry can't be evicted before it is used
+            if cached := self._cache.open(key):
+                self._spliced[schema, table] = cached
+            else:
+                self._fingerprint_keys[schema, table] = key
+
+        return list(self._spliced)
+
+    def rewrite(self, source: BinaryIO, sink: BinaryIO):
+        for data in self.rewritten(source):
+            sink.write(data)
+
+    def reader(self, source: BinaryIO) -> BinaryIO:
+        """
+        The rewritten dump, as a stream to read from.
+        """
+        return io.BufferedReader(_IteratorReader(self.rewritten(source)), buffer_size=READ_SIZE)
+
+    def rewritten(self, source: BinaryIO) -> Iterator[bytes]:
+        rewrite_row = None
+
+        for line in source:
+            # the cached data goes in the data section, before the first
+            # data entry or the post-data ones when there is none
+            if self._spliced and (header := _ENTRY_HEADER.match(line)):
+                if header['type'] == b'TABLE DATA' or header['type'] in POST_DATA_TYPES:
+                    yield from self._splice()
+
+            if rewrite_row:
+                if line.rstrip(b'\n') == END_OF_COPY:
+                    rewrite_row = None
+                    yield line
+                else:
+                    yield rewrite_row(line)
+                continue
+
+            if line.startswith(b'COPY ') and (match := _COPY_STATEMENT.match(line.rstrip(b'\n'))):
+                if rewriter := self._row_rewriter(match['table'], match['columns']):
+                    copy_statement, rewrite_row = rewriter
+                    yield copy_statement
+
+                    schema, table = _schema_and_table(match['table'])
+                    if key := self._fingerprint_keys.get((schema, table)):
+                        yield from self._rewrite_fingerprinted(table, key, copy_statement, source, rewrite_row)
+                        rewrite_row = None
+                    elif self._cache:
+                        yield from self._rewrite_cached(table, line, source, rewrite_row)
+                        rewrite_row = None
+                    continue
+
+            yield line
+
+        yield from self._splice()
+
+    def _splice(self) -> Iterator[bytes]:
+        for (schema, table), cached in self._spliced.items():
+            # the entry header pg_dump writes, the block is followed by the
+            # opening line of the next one
+            yield b'-- Data for Name: %s; Type: TABLE DATA; Schema: %s; Owner: -\n--\n\n' % (
+                table.encode(), schema.encode()
+            )
+            with cached:
+                yield from iter(lambda: cached.read(READ_SIZE), b'')
+            yield b'\n\n--\n'
+            self.reused_tables.append(table)
+
+        self._spliced = {}
+
+    def _rewrite_fingerprinted(
+        self,
+        table: str,
+        key: str,
+        copy_statement: bytes,
+        source: BinaryIO,
+        rewrite_row: Callable[[bytes], bytes],
+    ) -> Iterator[bytes]:
+        # stored with its COPY statement, to be spliced into dumps that
+        # leave the table's data out
+        with self._cache.store(key) as entry:
+            entry.write(copy_statement)
+            for line in source:
+                if line.rstrip(b'\n') == END_OF_COPY:
+                    entry.write(line)
+                    yield line
+                    return
+
+                anonymised = rewrite_row(line)
+                entry.write(anonymised)
+                yield anonymised
+
+            raise RuleError(f"Dump ends inside the data of table {table}")
+
+    def _rules_key(self, table: str) -> bytes:
+        return cache_key(
+            repr((sorted(self._specs[table].items()), sorted(self._only_rows.get(table, {}).items()))).encode(),
+            self._generators.fingerprint.encode(),
+        ).encode()
+
+    def _rewrite_cached(
+        self,
+        table: str,
+        copy_statement: bytes,
+        source: BinaryIO,
+        rewrite_row: Callable[[bytes], bytes],
+    ) -> Iterator[bytes]:
+        # The rows are spooled while hashing them, the key is only known at
+        # the end of the COPY block
+        digest = hashlib.sha256(copy_statement)
+        with tempfile.SpooledTemporaryFile(SPOOL_SIZE) as rows:
+            for line in source:
+                if line.rstrip(b'\n') == END_OF_COPY:
+                    break
+
+                digest.update(line)
+                rows.write(line)
+            else:
+                raise RuleError(f"Dump ends inside the data of table {table}")
+
+            key = cache_key(digest.digest(), self._rules_key(table))
+
+            if cached := self._cache.open(key):
+                with cached:
+                    yield from iter(lambda: cached.read(READ_SIZE), b'')
+                self.reused_tables.append(table)
+            else:
+                rows.seek(0)
+                with self._cache.store(key) as entry:
+                    for row in rows:
+                        anonymised = rewrite_row(row)
+                        yield anonymised
+                        entry.write(anonymised)
+
+        yield line
+
+    def _row_rewriter(
+        self, qualified_name: bytes, column_list: bytes
+    ) -> tuple[bytes, Callable[[bytes], bytes]] | None:
+        """
+        The COPY statement and the row rewriter of a table with rules.
+        """
+        table = _table_name(qualified_name)
+        rules = self._rules.get(table, {})
+        projections = self._projections.get(table, {})
+        if not rules and not projections:
+            return None
+
+        identifiers = _IDENTIFIER.findall(column_list)
+        columns = [_unquote_identifier(identifier) for identifier in identifiers]
+        missing = (set(rules) | set(projections) | set(self._only_rows.get(table, {}))) - set(columns)
+        if missing:
+            raise RuleError(f"Table {table} has no column(s) {', '.join(sorted(missing))}")
+
+        replacements = [(columns.index(column), generate) for column, generate in rules.items() if generate]
+        projected = [(columns.index(column), project) for column, project in projections.items() if project]
+        conditions = [
+            (columns.index(column), expected)
+            for column, expected in self._only_rows.get(table, {}).items()
+        ]
+        left_out = {
+            columns.index(column)
+            for column, rule in [*rules.items(), *projections.items()]
+            if rule is None
+        }
+        kept = [index for index in range(len(columns)) if index not in left_out]
+        copy_statement = b'COPY %s (%s) FROM stdin;\n' % (
+            qualified_name,
+            b', '.join(identifiers[index] for index in kept),
+        )
+
+        def rewrite_row(line: bytes) -> bytes:
+            fields = line.rstrip(b'\n').split(b'\t')
+
+            if not any(fields[index] != expected for index, expected in conditions):
+                for index, generate in replacements:
+                    fields[index] = generate(fields[index])
+            elif not projected and not left_out:
+                return line
+
+            for index, project in projected:
+                fields[index] = project(fields[index])
+
+            if left_out:
+                fields = [fields[index] for index in kept]
+
+            return b'\t'.join(fields) + b'\n'
+
+        return copy_statement, rewrite_row
+
+
+class _IteratorReader(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b''
+                return 0
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
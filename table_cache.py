@@ -0,0 +1,117 @@
+"""
+Local cache of anonymised table data.
+
+Entries are keyed by a hash of the source data of a table and of everything
+that decides how it is anonymised, so an unchanged table is anonymised once
+and its previous output reused afterwards. The least recently used entries
+are evicted once the cache grows over its maximum size.
+
+When the dump is still to be taken, tables are first fingerprinted from the
+source database: the write counters of the statistics collector, the file
+and the columns of the table. An unchanged fingerprint means the table's data
+can be left out of pg_dump and its cached anonymised data used instead. The
+counters are reported by backends within seconds, so writes from the last
+seconds before a dump can be missed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator
+
+DEFAULT_FOLDER = 'dumps/cache'
+DEFAULT_MAX_SIZE = 10 * 1024 ** 3
+
+# TRUNCATE doesn't count the rows it deletes but gives the table a new file,
+# and the reset time changes when the counters go back to zero
+FINGERPRINT_QUERY = '''
+SELECT coalesce(json_agg(json_build_object(
+    'schema', n.nspname,
+    'name', c.relname,
+    'fingerprint', concat_ws(
+        ':',
+        c.oid,
+        c.relfilenode,
+        s.n_tup_ins,
+        s.n_tup_upd,
+        s.n_tup_del,
+        d.stats_reset,
+        (SELECT string_agg(a.attname || ' ' || format_type(a.atttypid, a.atttypmod), ', ' ORDER BY a.attnum)
+         FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped)
+    )
+)), '[]')
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_stat_user_tables s ON s.relid = c.oid
+JOIN pg_stat_database d ON d.datname = current_database()
+WHERE c.relkind = 'r'
+  AND c.relname = ANY(ARRAY[%s]::text[])
+'''
+
+
+def cache_key(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+
+    return digest.hexdigest()
+
+
+def fingerprint_query(names: list[str]) -> str:
+    return FINGERPRINT_QUERY % ', '.join("'" + name.replace("'", "''") + "'" for name in names)
+
+
+def parse_fingerprints(output: str) -> dict[tuple[str, str], bytes]:
+    return {(table['schema'], table['name']): table['fingerprint'].encode() for table in json.loads(output)}
+
+
+class TableCache:
+    def __init__(self, folder: str = DEFAULT_FOLDER, *, max_size: int = DEFAULT_MAX_SIZE):
+        self.folder = folder
+        self.max_size = max_size
+
+    def open(self, key: str) -> BinaryIO | None:
+        path = self._path(key)
+        try:
+            stream = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        # entries are evicted by last use
+        os.utime(path)
+        return stream
+
+    @contextmanager
+    def store(self, key: str) -> Iterator[BinaryIO]:
+        os.makedirs(self.folder, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                yield stream
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        os.replace(temporary_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.copy'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+
+            os.remove(path)
+            size -= entry_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f'{key}.copy')
@@ -0,0 +1,183 @@
+import io
+from types import SimpleNamespace
+
+import docker
+import pytest
+
+import database_pool
+from database_pool import DatabasePool, load_unlogged, restore_logged
+
+DUMP = b'''CREATE TABLE public.users (
+    id integer NOT NULL,
+    note text DEFAULT 'a;'::text
+);
+
+CREATE TABLE public.measurement (
+    id integer NOT NULL,
+    logdate date NOT NULL
+)
+PARTITION BY RANGE (logdate);
+
+CREATE TABLE public.measurement_2020 (
+    id integer NOT NULL,
+    logdate date NOT NULL
+);
+
+CREATE UNLOGGED TABLE public.sessions (
+    id integer NOT NULL
+);
+
+ALTER TABLE ONLY public.measurement ATTACH PARTITION public.measurement_2020 FOR VALUES FROM ('2020-01-01') TO ('2021-01-01');
+
+COPY public.users (id, note) FROM stdin;
+1\tCREATE TABLE public.users (
+\\.
+'''
+
+
+def unlogged(dump: bytes) -> tuple[bytes, set[bytes]]:
+    sink = io.BytesIO()
+    tables = load_unlogged(io.BytesIO(dump), sink)
+    return sink.getvalue(), tables
+
+
+def test_tables_are_created_unlogged():
+    loaded, tables = unlogged(DUMP)
+
+    assert tables == {b'public.users', b'public.measurement_2020'}
+    assert b'CREATE UNLOGGED TABLE public.users (\n' in loaded
+    assert b'CREATE UNLOGGED TABLE public.measurement_2020 (\n' in loaded
+
+
+def test_partitioned_tables_stay_logged():
+    loaded, _ = unlogged(DUMP)
+
+    assert b'CREATE TABLE public.measurement (\n' in loaded
+    assert b'CREATE UNLOGGED TABLE public.measurement ' not in loaded
+
+
+def test_only_create_table_statements_change():
+    loaded, _ = unlogged(DUMP)
+
+    assert loaded.replace(b'CREATE UNLOGGED TABLE', b'CREATE TABLE') == DUMP.replace(b'CREATE UNLOGGED TABLE', b'CREATE TABLE')
+    assert loaded.endswith(b'1\tCREATE TABLE public.users (\n\\.\n')
+
+
+def test_statement_cut_by_the_end_of_the_dump_is_kept():
+    loaded, _ = unlogged(b'CREATE TABLE public.users (\n    id integer\n')
+
+    assert loaded == b'CREATE UNLOGGED TABLE public.users (\n    id integer\n'
+
+
+def test_restore_logged_reverts_only_the_changed_tables():
+    loaded, tables = unlogged(DUMP)
+    sink = io.BytesIO()
+    restore_logged(io.BytesIO(loaded), sink, tables)
+
+    # tables that were unlogged in the source database stay so
+    assert sink.getvalue() == DUMP
+
+
+def test_restore_logged_without_tables_copies_the_dump():
+    sink = io.BytesIO()
+    restore_logged(io.BytesIO(DUMP), sink, set())
+
+    assert sink.getvalue() == DUMP
+
+
+class FakeContainer:
+    def __init__(self, number: int):
+        self.id = f'container-{number}'
+        self.name = f'temporary-restore-db-{number}'
+        self.status = 'running'
+        self.statements = []
+
+    def reload(self):
+        pass
+
+    def exec_run(self, command: list[str], environment: dict):
+        self.statements.append(command[-1])
+        return SimpleNamespace(exit_code=0, output=b'')
+
+    def remove(self, force: bool):
+        self.status = 'removed'
+
+
+class FakeContainers:
+    def __init__(self):
+        self.started = []
+
+    def run(self, image: str, command: list[str], **options) -> FakeContainer:
+        self.started.append(FakeContainer(len(self.started)))
+        return self.started[-1]
+
+    def get(self, id: str) -> FakeContainer:
+        for container in self.started:
+            if container.id == id and container.status == 'running':
+                return container
+
+        raise docker.errors.NotFound(id)
+
+    def list(self, filters: dict) -> list[FakeContainer]:
+        return [container for container in self.started if container.status == 'running']
+
+
+@pytest.fixture
+def containers(monkeypatch, tmp_path):
+    containers = FakeContainers()
+    monkeypatch.setattr(docker, 'from_env', lambda: SimpleNamespace(containers=containers))
+    monkeypatch.setattr(database_pool, 'LOCKS_FOLDER', str(tmp_path))
+    return containers
+
+
+def fail_after_loading(pool: DatabasePool, dbname: str = 'users', resume_key: str = 'dump-1') -> FakeContainer:
+    with pytest.raises(RuntimeError):
+        with pool.acquire(dbname, resume_key=resume_key) as lease:
+            lease.resume_state = {'transformers': ['users.sql']}
+            raise RuntimeError("transformer failed")
+
+    return lease.container
+
+
+def test_failed_run_is_resumed_with_the_same_key(containers):
+    kept = fail_after_loading(DatabasePool('postgres:16', {}))
+
+    with DatabasePool('postgres:16', {}).acquire('users', resume_key='dump-1') as lease:
+        assert lease.container is kept
+        assert lease.resume_state == {'transformers': ['users.sql']}
+
+
+@pytest.mark.parametrize('resume_key', ['dump-2', None])
+def test_kept_database_is_removed_by_a_run_not_resuming_it(containers, resume_key):
+    kept = fail_after_loading(DatabasePool('postgres:16', {}))
+
+    with DatabasePool('postgres:16', {}).acquire('users', resume_key=resume_key) as lease:
+        assert kept.status == 'removed'
+        assert lease.container is not kept and not lease.resumed
+
+
+def test_expired_databases_are_released_by_any_run(containers):
+    kept = fail_after_loading(DatabasePool('postgres:16', {}))
+
+    with DatabasePool('postgres:16', {}, kept_max_age=0).acquire('talks'):
+        assert kept.status == 'removed'
+
+
+def test_release_kept(containers):
+    pool = DatabasePool('postgres:16', {})
+    kept = [fail_after_loading(pool, 'users'), fail_after_loading(pool, 'talks')]
+
+    assert pool.release_kept(max_age=60) == 0
+    assert pool.release_kept() == 2
+    assert [container.status for container in kept] == ['removed', 'removed']
+    assert pool.release_kept() == 0
+
+
+def test_released_pooled_container_is_reset(containers):
+    pool = DatabasePool('postgres:16', {}, pooled=True)
+    kept = fail_after_loading(pool)
+    kept.statements.clear()
+
+    assert pool.release_kept() == 1
+    assert kept.status == 'running'
+    assert kept.statements == ['DROP DATABASE IF EXISTS "users" WITH (FORCE)', 'CREATE DATABASE "users"']
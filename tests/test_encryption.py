@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+import encryption
+from encryption import DecryptionError, EncryptingWriter, decrypt_file, encrypt_file, open_decrypted, open_encrypted
+
+KEY = Fernet.generate_key()
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip', 'zstd'])
+def test_encrypted_file_round_trip(tmp_path, compression):
+    data = os.urandom(3 * 1024 * 1024) + b'\n' * 1024 * 1024
+    (tmp_path / 'dump.sql').write_bytes(data)
+
+    encrypt_file(str(tmp_path / 'dump.sql'), str(tmp_path / 'dump.sql.enc'), KEY, compression=compression)
+    digest = decrypt_file(str(tmp_path / 'dump.sql.enc'), str(tmp_path / 'restored.sql'), KEY)
+
+    assert (tmp_path / 'restored.sql').read_bytes() == data
+    assert digest == hashlib.sha256(data).hexdigest()
+
+
+def encrypted(data: bytes, chunk_size: int = 1024) -> bytes:
+    sink = io.BytesIO()
+    with EncryptingWriter(sink, KEY, chunk_size=chunk_size) as writer:
+        writer.write(data)
+
+    return sink.getvalue()
+
+
+def decrypted(artifact: bytes) -> bytes:
+    return open_decrypted(io.BytesIO(artifact), KEY).read()
+
+
+def test_decrypts_what_was_encrypted():
+    data = os.urandom(3000)
+    assert decrypted(encrypted(data)) == data
+
+
+# header, then frames of their length, 1024 bytes of plaintext and a tag
+@pytest.mark.parametrize('size', [19 + 1044, 19 + 2 * 1044, 19 + 2 * 1044 + 100, 19 + 2 * 1044 + 4])
+def test_truncated_artifact_fails(size):
+    artifact = encrypted(os.urandom(3000))
+
+    with pytest.raises(DecryptionError):
+        decrypted(artifact[:size])
+
+
+def test_tampered_artifact_fails():
+    artifact = bytearray(encrypted(os.urandom(3000)))
+    artifact[19 + 1044 + 100] ^= 1
+
+    with pytest.raises(DecryptionError):
+        decrypted(bytes(artifact))
+
+
+def test_wrong_key_fails():
+    with pytest.raises(DecryptionError):
+        open_decrypted(io.BytesIO(encrypted(b'data')), Fernet.generate_key()).read()
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip', 'zstd'])
+def test_failed_producer_leaves_an_artifact_that_fails(compression):
+    sink = io.BytesIO()
+    with pytest.raises(RuntimeError):
+        with open_encrypted(sink, KEY, compression=compression) as artifact:
+            artifact.write(os.urandom(3 * 1024 * 1024))
+            raise RuntimeError("pg_dump exited with status 1")
+
+    with pytest.raises(DecryptionError):
+        decrypted(sink.getvalue())
+
+
+def test_failed_encryption_removes_the_artifact(tmp_path, monkeypatch):
+    (tmp_path / 'dump.sql').write_bytes(os.urandom(3 * 1024 * 1024))
+
+    def interrupted_copy(source, destination, length):
+        destination.write(source.read(length))
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(encryption.shutil, 'copyfileobj', interrupted_copy)
+    with pytest.raises(OSError):
+        encrypt_file(str(tmp_path / 'dump.sql'), str(tmp_path / 'dump.sql.enc'), KEY)
+
+    assert not (tmp_path / 'dump.sql.enc').exists()
@@ -0,0 +1,83 @@
+import io
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from instrumentation import Recorder, counted, current_span, propagate
+
+
+def test_spans_nest_and_record_their_counters():
+    recorder = Recorder()
+    with recorder.span('pipeline') as pipeline:
+        with recorder.span('pg_dump', table='users') as pg_dump:
+            assert current_span() is pg_dump
+            pg_dump.add('rows', 2)
+            pg_dump.add('rows', 3)
+
+    assert current_span() is None
+    assert pg_dump.path == 'pipeline/pg_dump' and pg_dump.parent_id == pipeline.id
+    assert pg_dump.counters == {'bytes_in': 0, 'bytes_out': 0, 'rows': 5}
+    assert pg_dump.duration >= 0 and pg_dump.peak_rss > 0
+    assert json.loads(recorder.to_json())['spans'][1]['attributes'] == {'table': 'users'}
+
+
+def test_failed_spans_record_the_error():
+    recorder = Recorder()
+    with pytest.raises(ConnectionError), recorder.span('upload') as upload:
+        raise ConnectionError("connection reset")
+
+    assert upload.attributes == {'error': 'ConnectionError'}
+    assert upload.duration is not None
+
+
+def test_propagated_work_is_nested_under_the_submitting_span():
+    recorder = Recorder()
+
+    def transformer(name: str):
+        with recorder.span(f'transformer {name}') as transformer_span:
+            return transformer_span.path
+
+    with recorder.span('transformers'), ThreadPoolExecutor() as executor:
+        paths = list(executor.map(propagate(transformer), ['users.sql', 'grants.sql']))
+
+    assert paths == ['transformers/transformer users.sql', 'transformers/transformer grants.sql']
+
+
+def test_counted_streams_add_to_the_span():
+    recorder = Recorder()
+    with recorder.span('load') as load:
+        source = counted(io.BytesIO(b'line 1\nline 2\n'), 'bytes_in')
+        sink = counted(io.BytesIO(), 'bytes_out')
+        for line in source:
+            sink.write(line.upper())
+
+    assert load.counters['bytes_in'] == load.counters['bytes_out'] == 14
+
+
+def test_streams_are_not_counted_outside_of_spans():
+    stream = io.BytesIO()
+    assert counted(stream, 'bytes_in') is stream
+
+
+def test_openmetrics():
+    recorder = Recorder()
+    with recorder.span('pipeline'):
+        with recorder.span('transformer "users".sql') as transformer:
+            transformer.add('rows', 7)
+
+    lines = recorder.to_openmetrics().splitlines()
+
+    assert lines[-1] == '# EOF'
+    assert '# TYPE anonymizer_span_rows gauge' in lines
+    assert 'anonymizer_span_rows{span="pipeline/transformer \\"users\\".sql",id="1"} 7' in lines
+    assert re.search(r'^anonymizer_span_duration_seconds\{span="pipeline",id="0"\} \d+\.\d+(e-\d+)?$', '\n'.join(lines), re.MULTILINE)
+    # every sample belongs to a declared metric
+    declared = {line.split()[2] for line in lines if line.startswith('# TYPE')}
+    assert {line.split('{')[0] for line in lines if not line.startswith('#')} <= declared
+
+
+def test_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError, match='Unknown metrics format'):
+        Recorder().write(str(tmp_path / 'metrics.txt'), 'prometheus')
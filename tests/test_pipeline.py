@@ -0,0 +1,51 @@
+import pytest
+
+import pipeline
+from pipeline import PipelineError, native_binary, postgres_command
+
+
+@pytest.fixture
+def installed(monkeypatch, tmp_path):
+    """
+    Install fake client programs of the given major version on the PATH.
+    """
+    monkeypatch.setattr(pipeline, 'NATIVE_FOLDERS', ())
+    monkeypatch.setenv('PATH', str(tmp_path))
+    native_binary.cache_clear()
+
+    def install(major: int, *programs: str):
+        for program in programs:
+            path = tmp_path / program
+            path.write_text(f'#!/bin/sh\necho "{program} (PostgreSQL) {major}.1"\n')
+            path.chmod(0o755)
+
+    yield install
+    native_binary.cache_clear()
+
+
+def test_newer_clients_are_used(installed):
+    installed(17, 'psql', 'pg_restore')
+
+    assert postgres_command(16, ['psql', '-c', 'SELECT 1'])[1:] == ['-c', 'SELECT 1']
+    assert postgres_command(16, ['psql'])[0].endswith('/psql')
+
+
+def test_newer_pg_dump_is_not_used(installed):
+    # its dumps set transaction_timeout, which a 16 server rejects
+    installed(17, 'pg_dump', 'psql')
+
+    assert postgres_command(16, ['pg_dump', '--no-owner'])[:4] == ['docker', 'run', '--rm', '--network=host']
+    with pytest.raises(PipelineError, match='No local pg_dump of version 16 found'):
+        postgres_command(16, ['pg_dump'], client='native')
+
+
+def test_pg_dump_of_the_same_version_is_used(installed):
+    installed(16, 'pg_dump')
+
+    assert postgres_command(16, ['pg_dump'])[0].endswith('/pg_dump')
+
+
+def test_older_clients_are_not_used(installed):
+    installed(15, 'psql')
+
+    assert postgres_command(16, ['psql'])[0] == 'docker'
@@ -0,0 +1,88 @@
+import hashlib
+import json
+
+from pipeline_state import PipelineState, file_signature
+
+
+def completed_state(tmp_path, stage: str = 'dump', data: bytes = b'COPY users FROM stdin;\n') -> tuple[PipelineState, str]:
+    state = PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-1')
+    output = str(tmp_path / f'{stage}.sql')
+    with state.output(output) as sink:
+        sink.write(data[:5])
+        sink.write(data[5:])
+    state.complete(stage, [output])
+
+    return state, output
+
+
+def test_checksum_is_computed_while_writing(tmp_path):
+    state, output = completed_state(tmp_path)
+
+    saved = json.loads((tmp_path / 'pipeline-state.json').read_text())
+    assert saved['stages']['dump']['outputs'] == {
+        output: {'size': 23, 'sha256': hashlib.sha256(b'COPY users FROM stdin;\n').hexdigest()},
+    }
+
+
+def test_completed_stage_is_found_by_the_next_run(tmp_path):
+    completed_state(tmp_path)
+
+    state = PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-1')
+    assert state.is_completed('dump')
+    assert not state.is_completed('anonymise')
+
+
+def test_changed_outputs_are_not_completed(tmp_path):
+    _, output = completed_state(tmp_path)
+
+    # same size, and the modification time doesn't matter
+    with open(output, 'r+b') as stream:
+        stream.write(b'copy')
+    assert not PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-1').is_completed('dump')
+
+
+def test_missing_outputs_are_not_completed(tmp_path):
+    completed_state(tmp_path)
+
+    (tmp_path / 'dump.sql').unlink()
+    assert not PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-1').is_completed('dump')
+
+
+def test_stages_of_another_config_are_ignored(tmp_path):
+    completed_state(tmp_path)
+
+    assert not PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-2').is_completed('dump')
+
+
+def test_completing_a_stage_drops_the_later_ones(tmp_path):
+    state, _ = completed_state(tmp_path)
+    with state.output(str(tmp_path / 'anonymised.sql')) as sink:
+        sink.write(b'anonymised')
+    state.complete('anonymise', [str(tmp_path / 'anonymised.sql')])
+
+    with state.output(str(tmp_path / 'dump.sql')) as sink:
+        sink.write(b'new dump')
+    state.complete('dump', [str(tmp_path / 'dump.sql')])
+
+    state = PipelineState(str(tmp_path / 'pipeline-state.json'), 'config-1')
+    assert state.is_completed('dump')
+    assert not state.is_completed('anonymise')
+
+
+def test_clear(tmp_path):
+    state, _ = completed_state(tmp_path)
+    state.clear()
+
+    assert not (tmp_path / 'pipeline-state.json').exists()
+    assert not state.is_completed('dump')
+    # twice is fine
+    state.clear()
+
+
+def test_files_of_another_size_are_not_hashed(tmp_path):
+    path = tmp_path / 'dump.sql'
+    path.write_bytes(b'dump')
+
+    assert file_signature(str(path), expected_size=3) == {'size': 4}
+    assert file_signature(str(path), expected_size=4) == {'size': 4, 'sha256': hashlib.sha256(b'dump').hexdigest()}
+    assert file_signature(str(tmp_path / 'missing.sql')) is None
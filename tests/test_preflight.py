@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from preflight import TableSize, format_size, parse_sizes, plan, report, table_pattern
+
+MB = 1024 ** 2
+
+
+def tables() -> list[TableSize]:
+    return [
+        TableSize('public', 'users', 1000, 10 * MB, 12 * MB),
+        TableSize('public', 'social_auth_nonce', 10, MB, MB),
+        TableSize('audit', 'events', -1, 500 * MB, 600 * MB),
+        TableSize('public', 'events', 100, 200 * MB, 210 * MB),
+    ]
+
+
+def skipped(*args, **kwargs) -> dict[str, str]:
+    return {table.qualified_name: table.skip_reason for table in plan(tables(), *args, **kwargs)}
+
+
+def test_skip_patterns_match_the_name_or_the_qualified_name():
+    assert skipped(['social_auth_*']) == {'public.social_auth_nonce': 'skip rule'}
+    assert skipped(['events']) == {'audit.events': 'skip rule', 'public.events': 'skip rule'}
+    assert skipped(['audit.*']) == {'audit.events': 'skip rule'}
+    # patterns match whole names, with their case
+    assert skipped(['user', 'Users', 'public']) == {}
+
+
+def test_tables_over_max_size_are_skipped_unless_allowed():
+    assert skipped([], max_size=100 * MB) == {'audit.events': 'over 100.0 MB', 'public.events': 'over 100.0 MB'}
+    assert skipped([], max_size=100 * MB, allow=['public.events']) == {'audit.events': 'over 100.0 MB'}
+    # skip rules win over allow patterns
+    assert skipped(['audit.*'], max_size=100 * MB, allow=['events']) == {'audit.events': 'skip rule'}
+
+
+def test_parse_sizes():
+    output = json.dumps([{'schema': 'public', 'name': 'users', 'rows': -1, 'data_size': 8192, 'total_size': 16384}])
+    [table] = parse_sizes(output)
+
+    assert (table.qualified_name, table.rows, table.data_size) == ('public.users', None, 8192)
+
+
+@pytest.mark.parametrize('schema, name, pattern', [
+    ('public', 'users', '"public"."users"'),
+    ('public', 'Users', '"public"."Users"'),
+    ('my schema', 'say "hi"', '"my schema"."say ""hi"""'),
+])
+def test_table_pattern(schema, name, pattern):
+    assert table_pattern(schema, name) == pattern
+
+
+@pytest.mark.parametrize('size, formatted', [
+    (0, '0 B'),
+    (1023, '1023 B'),
+    (1536, '1.5 KB'),
+    (200 * MB, '200.0 MB'),
+    (3 * 1024 ** 4, '3.0 TB'),
+])
+def test_format_size(size, formatted):
+    assert format_size(size) == formatted
+
+
+def test_report_estimates_the_dump_size(capsys, monkeypatch):
+    # wide enough for the table names
+    monkeypatch.setenv('COLUMNS', '200')
+    sizes = tables()
+    plan(sizes, ['audit.*'])
+    report(sizes, limit=1)
+
+    output = capsys.readouterr().out
+    assert 'audit.events' in output and 'public.events' in output
+    assert 'public.users' not in output
+    assert '2 smaller table(s) not shown' in output
+    assert 'Estimated dump size: 211.0 MB of table data, 500.0 MB skipped in 1 table(s)' in output
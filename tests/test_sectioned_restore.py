@@ -0,0 +1,129 @@
+import io
+
+from sectioned_restore import balance, group_by_tables, load_data, parse_post_data, session_settings
+
+PRE_DATA = b'''SET statement_timeout = 0;
+SELECT pg_catalog.set_config('search_path', '', false);
+\\restrict abc
+
+--
+-- Name: pycon; Type: DATABASE; Schema: -; Owner: -
+--
+
+CREATE DATABASE pycon;
+\\connect -reuse-previous=on "dbname='pycon''s'"
+
+SET statement_timeout = 0;
+
+--
+-- Name: users; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.users (id integer);
+
+'''
+DATA = b'''--
+-- Data for Name: users; Type: TABLE DATA; Schema: public; Owner: -
+--
+
+COPY public.users (id) FROM stdin;
+1
+\\.
+
+'''
+POST_DATA = b'''--
+-- Name: users users_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.users
+    ADD CONSTRAINT users_pkey PRIMARY KEY (id);
+
+--
+-- Name: talks_speaker; Type: INDEX; Schema: public; Owner: -
+--
+
+CREATE INDEX talks_speaker ON public.talks USING btree (speaker_id);
+
+--
+-- Name: talks talks_speaker_fk; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.talks
+    ADD CONSTRAINT talks_speaker_fk FOREIGN KEY (speaker_id) REFERENCES public.users(id);
+
+--
+-- Name: users update_users; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER update_users BEFORE UPDATE ON public.users FOR EACH ROW EXECUTE FUNCTION public.touch();
+
+\\unrestrict abc
+'''
+
+
+def test_load_data_stops_at_the_post_data(tmp_path):
+    loaded = tmp_path / 'loaded.sql'
+    preamble, post_data, data_sizes, dbname = load_data(
+        io.BytesIO(PRE_DATA + DATA + POST_DATA), ['sh', '-c', f'cat > {loaded}'], {'synchronous_commit': 'off'}
+    )
+
+    assert preamble == b"SET statement_timeout = 0;\nSELECT pg_catalog.set_config('search_path', '', false);\n"
+    # from the header of the first post-data entry
+    assert post_data == POST_DATA[len(b'--\n'):]
+    assert dbname == "pycon's"
+    # from the COPY statement to the header of the next entry
+    assert data_sizes == {b'public.users': len(DATA[DATA.index(b'COPY'):] + b'--\n')}
+    # the settings are sent again after reconnecting
+    settings = session_settings({'synchronous_commit': 'off'})
+    assert loaded.read_bytes() == settings + PRE_DATA.replace(b"'pycon''s'\"\n", b"'pycon''s'\"\n" + settings) + DATA + b'--\n'
+
+
+def test_post_data_is_split_in_entries():
+    entries = parse_post_data(POST_DATA)
+
+    assert [entry.type for entry in entries] == [b'', b'CONSTRAINT', b'INDEX', b'FK CONSTRAINT', b'TRIGGER']
+    assert [entry.tables for entry in entries] == [
+        set(), {b'public.users'}, {b'public.talks'}, {b'public.talks', b'public.users'}, set(),
+    ]
+    # the meta-commands belong to the session that read the whole dump
+    assert b'restrict' not in b''.join(entry.text for entry in entries)
+    assert b''.join(entry.text for entry in entries) == POST_DATA.replace(b'\\unrestrict abc\n', b'')
+
+
+def test_empty_post_data():
+    assert parse_post_data(b'\n') == []
+
+
+def foreign_key(name: str, table: str, referenced: str):
+    text = f'ALTER TABLE ONLY {table}\n    ADD CONSTRAINT {name} FOREIGN KEY (id) REFERENCES {referenced}(id);\n'
+    return parse_post_data(
+        f'--\n-- Name: {table} {name}; Type: FK CONSTRAINT; Schema: public; Owner: -\n--\n\n{text}'.encode()
+    )[1]
+
+
+def test_foreign_keys_sharing_tables_are_grouped():
+    talks = foreign_key('talks_fk', 'public.talks', 'public.users')
+    grants = foreign_key('grants_fk', 'public.grants', 'public.conferences')
+    # links the two groups above
+    schedule = foreign_key('schedule_fk', 'public.conferences', 'public.talks')
+    orders = foreign_key('orders_fk', 'public.orders', 'public.orders')
+
+    groups = group_by_tables([talks, grants, orders, schedule])
+
+    # the order within a group doesn't matter, its entries run in one session
+    assert [sorted(entry.text for entry in group) for group in groups] == [
+        [orders.text],
+        sorted([talks.text, grants.text, schedule.text]),
+    ]
+
+
+def test_largest_groups_are_spread_first():
+    users = foreign_key('users_fk', 'public.users', 'public.users')
+    talks = foreign_key('talks_fk', 'public.talks', 'public.talks')
+    grants = foreign_key('grants_fk', 'public.grants', 'public.grants')
+    sizes = {b'public.users': 100, b'public.talks': 60, b'public.grants': 50}
+
+    scripts = balance([[talks], [users], [grants]], sizes, jobs=2)
+
+    assert scripts == [users.text, talks.text + grants.text]
+    assert balance([[talks]], sizes, jobs=4) == [talks.text]
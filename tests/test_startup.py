@@ -0,0 +1,24 @@
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+# slow to import and only needed by some commands, see benchmarks/startup.py
+LAZY_PACKAGES = ('boto3', 'botocore', 'azure', 'docker')
+
+_IMPORT_LINE = re.compile(r'^import time:\s+\d+ \|\s+\d+ \|\s+(?P<module>\S+)$')
+
+
+def test_help_does_not_import_the_cloud_and_docker_sdks():
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'main.py', '--help'],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+
+    modules = [match['module'] for match in map(_IMPORT_LINE.match, result.stderr.splitlines()) if match]
+    assert 'typer' in modules
+    assert [module for module in modules if module.split('.')[0] in LAZY_PACKAGES] == []
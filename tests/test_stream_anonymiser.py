@@ -0,0 +1,216 @@
+import io
+import re
+from pathlib import Path
+
+import pytest
+import yaml
+
+from main import make_projector
+from stream_anonymiser import Generators, RuleError, StreamAnonymiser, load_dictionaries
+
+ROOT = Path(__file__).parent.parent
+TRANSFORMERS = ROOT / 'transformers'
+
+# the stream rule each SQL expression of the transformers stands for
+SQL_GENERATORS = {
+    'random_first_name()': 'first_name',
+    'random_last_name()': 'last_name',
+    "random_first_name() || ' ' || random_last_name()": 'full_name',
+    'random_email()': 'email',
+    'random_username()': 'username',
+    'random_date_of_birth()': 'date_of_birth',
+    'random_word()': 'word',
+    'random_text()': 'text',
+}
+
+_REWRITE_TABLE = re.compile(
+    r"rewrite_table\('(?P<table>\w+)', jsonb_build_object\((?P<assignments>.*?)\)(?:, condition => '(?P<condition>[^']*)')?\);",
+    re.DOTALL,
+)
+_ASSIGNMENT = re.compile(r"'(?P<column>\w+)', (?:\$\$(?P<dollar_quoted>.*?)\$\$|'(?P<quoted>[^']*)')")
+_UPDATE = re.compile(r'UPDATE (?P<table>\w+)\s+SET(?P<assignments>.*?);', re.DOTALL)
+_SET = re.compile(r"(?P<column>\w+) = (?P<value>'[^']*'|\d+)")
+
+
+def rule_of(expression: str) -> object:
+    if expression in SQL_GENERATORS:
+        return SQL_GENERATORS[expression]
+
+    if expression.startswith("'") and expression.endswith("'"):
+        return {'value': expression[1:-1]}
+
+    if expression.isdigit():
+        return {'value': expression}
+
+    raise AssertionError(f"No stream rule for the SQL expression {expression}")
+
+
+def transformer_rules(transformers: list[str]) -> tuple[dict, dict]:
+    """
+    The `columns` and `only_rows` equivalent to the transformers.
+    """
+    columns, only_rows = {}, {}
+    for transformer in transformers:
+        sql = (TRANSFORMERS / transformer).read_text()
+
+        for match in _REWRITE_TABLE.finditer(sql):
+            for assignment in _ASSIGNMENT.finditer(match['assignments']):
+                expression = assignment['dollar_quoted'] if assignment['dollar_quoted'] is not None else assignment['quoted']
+                columns[f"{match['table']}.{assignment['column']}"] = rule_of(expression)
+            if match['condition']:
+                column, _, value = match['condition'].partition(' = ')
+                only_rows[match['table']] = {column: yaml.safe_load(value)}
+
+        for match in _UPDATE.finditer(sql):
+            for assignment in _SET.finditer(match['assignments']):
+                columns[f"{match['table']}.{assignment['column']}"] = rule_of(assignment['value'])
+
+    return columns, only_rows
+
+
+def normalized(columns: dict) -> dict:
+    return {
+        target: {'value': str(rule['value'])} if isinstance(rule, dict) else rule
+        for target, rule in columns.items()
+    }
+
+
+@pytest.mark.parametrize('config_file', ['users-config.yaml', 'pycon-config.yaml'])
+def test_config_rules_match_the_transformers(config_file):
+    config = yaml.safe_load((ROOT / config_file).read_text())
+    columns, only_rows = transformer_rules(config['transformers'])
+
+    assert normalized(config.get('columns', {})) == columns
+    assert config.get('only_rows', {}) == only_rows
+    # and the stream anonymiser accepts them
+    StreamAnonymiser(config['columns'], config.get('only_rows'))
+
+
+def test_generators_use_the_dictionaries_of_the_transformers():
+    dictionaries = load_dictionaries()
+    generators = Generators(dictionaries, seed=1)
+
+    assert generators.first_name() in dictionaries['fake_first_names']
+    assert generators.word() in dictionaries['fake_words']
+    assert generators.email().endswith('@fake.com')
+    assert len(generators.text().split(' ')) == 5
+
+
+def anonymised(dump: str, columns: dict, only_rows: dict | None = None, **options) -> str:
+    sink = io.BytesIO()
+    anonymiser = StreamAnonymiser(columns, only_rows, generators=Generators(load_dictionaries(), seed=1), **options)
+    anonymiser.rewrite(io.BytesIO(dump.encode()), sink)
+    return sink.getvalue().decode()
+
+
+DUMP = '''SET statement_timeout = 0;
+COPY public.users (id, "E-mail", is_staff, bio) FROM stdin;
+1\tada@example.com\tf\tfirst\\tline
+2\tbob@example.com\tt\t\\N
+\\.
+
+COPY public.talks (id, title) FROM stdin;
+1\tUntouched
+\\.
+'''
+
+
+def test_rewrites_only_the_columns_with_rules():
+    output = anonymised(DUMP, {'users.E-mail': {'value': 'x@fake.com'}})
+
+    assert output == DUMP.replace('ada@example.com', 'x@fake.com').replace('bob@example.com', 'x@fake.com')
+
+
+def test_only_rows_leaves_other_rows_unchanged():
+    output = anonymised(DUMP, {'users.E-mail': {'value': 'x@fake.com'}}, {'users': {'is_staff': False}})
+
+    assert '1\tx@fake.com\tf' in output
+    assert '2\tbob@example.com\tt' in output
+
+
+def test_left_out_columns_are_removed_from_the_copy_statement():
+    output = anonymised(DUMP, {}, projections={'users.bio': 'default'})
+
+    assert 'COPY public.users (id, "E-mail", is_staff) FROM stdin;\n1\tada@example.com\tf\n' in output
+
+
+def test_constants_are_escaped_for_copy():
+    output = anonymised(DUMP, {'users.bio': {'value': 'a\tb\\c'}, 'users.is_staff': {'value': True}})
+
+    assert '1\tada@example.com\tt\ta\\tb\\\\c\n' in output
+
+
+@pytest.mark.parametrize('field, size, expected', [
+    ('abcdef', 3, 'abc'),
+    ('ab', 3, 'ab'),
+    ('\\N', 1, '\\N'),
+    # an escape sequence isn't cut in half
+    ('ab\\tcd', 3, 'ab'),
+    ('a\\\\b', 2, 'a'),
+    ('a\\\\b', 3, 'a\\\\'),
+    # nor is a character
+    ('aé', 2, 'a'),
+    # two hex digits per byte
+    ('\\\\x0a0b0c', 2, '\\\\x0a0b'),
+    ('€uro', 2, ''),
+    ('abc', 0, ''),
+])
+def test_truncate(field, size, expected):
+    dump = f'COPY public.t (value) FROM stdin;\n{field}\n\\.\n'
+    assert anonymised(dump, {}, projections={'t.value': {'truncate': size}}) == dump.replace(field, expected)
+
+
+def test_projections_apply_to_every_row():
+    projections = {'users.bio': {'truncate': 3}, 'users.is_staff': 'null'}
+    output = anonymised(DUMP, {'users.E-mail': {'value': 'x@fake.com'}}, {'users': {'is_staff': False}}, projections=projections)
+
+    assert '1\tx@fake.com\t\\N\tfir\n' in output
+    # left alone by the rule, but not by the projections
+    assert '2\tbob@example.com\t\\N\t\\N\n' in output
+
+
+def test_projector_reads_the_projected_dump():
+    config = {'projections': {'users.bio': {'truncate': 3}}}
+    projector = make_projector(config)
+    rewritten = io.BytesIO()
+    projector.rewrite(io.BytesIO(DUMP.encode()), rewritten)
+
+    assert make_projector(config).reader(io.BytesIO(DUMP.encode())).read() == rewritten.getvalue()
+    assert '1\tada@example.com\tf\tfir\n' in rewritten.getvalue().decode()
+
+
+@pytest.mark.parametrize('config', [{}, {'projections': {'users.bio': 'default'}, 'format': 'directory'}])
+def test_no_projector(config):
+    assert make_projector(config) is None
+
+
+def test_placeholder():
+    dump = 'COPY public.t (a, b) FROM stdin;\nsecret\t\\\\xdeadbeef\n\\N\t\\N\n\\.\n'
+    output = anonymised(dump, {}, projections={'t.a': {'placeholder': 3}, 't.b': {'placeholder': 2}})
+
+    assert output == 'COPY public.t (a, b) FROM stdin;\nxxx\t\\\\x0000\n\\N\t\\N\n\\.\n'
+
+
+@pytest.mark.parametrize('columns, only_rows, message', [
+    ({'users.email': 'fingerprint'}, None, 'Unknown generator'),
+    ({'users.email': 'get'}, None, 'Unknown generator'),
+    ({'users.email': '_random'}, None, 'Unknown generator'),
+    ({'email': 'email'}, None, 'table.column'),
+    ({'users.email': {'length': 3}}, None, 'Invalid rule'),
+    ({'users.email': 'default'}, {'users': {'is_staff': False}}, "can't be combined with only_rows"),
+])
+def test_invalid_rules_fail_when_loaded(columns, only_rows, message):
+    with pytest.raises(RuleError, match=message):
+        StreamAnonymiser(columns, only_rows)
+
+
+def test_rules_for_missing_columns_fail():
+    with pytest.raises(RuleError, match='has no column'):
+        anonymised(DUMP, {'users.phone': 'word'})
+
+
+def test_dump_ending_inside_cached_table_data_fails(tmp_path):
+    from table_cache import TableCache
+
+    with pytest.raises(RuleError, match='ends inside'):
+        anonymised('COPY public.users (id, email) FROM stdin;\n1\ta\n', {'users.email': 'email'}, cache=TableCache(str(tmp_path)))
@@ -0,0 +1,24 @@
+import pytest
+
+from main import subset_filters
+
+
+@pytest.mark.parametrize('condition, expected', [
+    ('10%', 'random() < 0.1'),
+    (' 2.5% ', 'random() < 0.025'),
+    ('100%', 'random() < 1.0'),
+    ('0%', 'random() < 0.0'),
+    # conditions are used as they are
+    ("created_at > now() - interval '1 year'", "created_at > now() - interval '1 year'"),
+    ("email LIKE '%@python.it'", "email LIKE '%@python.it'"),
+    ('id % 10 = 0', 'id % 10 = 0'),
+])
+def test_subset_filters(condition, expected):
+    assert subset_filters({'users': condition}) == {'users': expected}
+
+
+def test_every_root_table_gets_its_filter():
+    assert subset_filters({'users': '50%', 'conferences_conference': 'id = 1'}) == {
+        'users': 'random() < 0.5',
+        'conferences_conference': 'id = 1',
+    }
@@ -0,0 +1,139 @@
+import io
+import os
+
+import pytest
+
+from stream_anonymiser import Generators, StreamAnonymiser, load_dictionaries
+from table_cache import TableCache, cache_key, fingerprint_query, parse_fingerprints
+
+SCHEMA = '''--
+-- Name: users; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.users (id integer, email text);
+
+
+'''
+TALKS_DATA = '''--
+-- Data for Name: talks; Type: TABLE DATA; Schema: public; Owner: -
+--
+
+COPY public.talks (id, title) FROM stdin;
+1\tTalk
+\\.
+
+
+'''
+USERS_DATA = '''--
+-- Data for Name: users; Type: TABLE DATA; Schema: public; Owner: -
+--
+
+COPY public.users (id, email) FROM stdin;
+1\tada@example.com
+\\.
+
+
+'''
+POST_DATA = '''--
+-- Name: users users_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.users ADD CONSTRAINT users_pkey PRIMARY KEY (id);
+'''
+FINGERPRINTS = {('public', 'users'): b'16386:16386:1000:0:0::id integer, email text'}
+
+
+def test_fingerprint_query_quotes_the_names():
+    assert "ARRAY['users', 'it''s']::text[]" in fingerprint_query(['users', "it's"])
+
+
+def test_parse_fingerprints():
+    output = '[{"schema" : "public", "name" : "users", "fingerprint" : "16386:16386:1000:0:0::id integer"}]'
+
+    assert parse_fingerprints(output) == {('public', 'users'): b'16386:16386:1000:0:0::id integer'}
+
+
+def test_cache_key_parts_are_delimited():
+    assert cache_key(b'ab', b'c') != cache_key(b'a', b'bc')
+
+
+def test_stored_entries_are_opened(tmp_path):
+    cache = TableCache(str(tmp_path))
+    with cache.store('key') as entry:
+        entry.write(b'COPY public.users (id) FROM stdin;\n1\n\\.\n')
+
+    with cache.open('key') as stream:
+        assert stream.read() == b'COPY public.users (id) FROM stdin;\n1\n\\.\n'
+    assert cache.open('other') is None
+
+
+def test_interrupted_store_leaves_nothing(tmp_path):
+    cache = TableCache(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with cache.store('key') as entry:
+            entry.write(b'COPY public.users (id) FROM stdin;\n')
+            raise RuntimeError("pg_dump exited with status 1")
+
+    assert cache.open('key') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TableCache(str(tmp_path), max_size=20)
+    for age, key in enumerate(['recent', 'old']):
+        with cache.store(key) as entry:
+            entry.write(b'x' * 10)
+        os.utime(tmp_path / f'{key}.copy', (1000 - age, 1000 - age))
+
+    # opening an entry makes it the most recently used one
+    cache.open('old').close()
+    with cache.store('new') as entry:
+        entry.write(b'x' * 10)
+
+    assert sorted(os.listdir(tmp_path)) == ['new.copy', 'old.copy']
+
+
+def anonymised(dump: str, cache: TableCache, fingerprints: dict, columns: dict | None = None) -> tuple[str, list]:
+    anonymiser = StreamAnonymiser(
+        columns or {'users.email': 'email'}, generators=Generators(load_dictionaries(), seed=1), cache=cache
+    )
+    # the tables returned are the ones left out of pg_dump
+    unchanged = anonymiser.splice_unchanged(fingerprints)
+    sink = io.BytesIO()
+    anonymiser.rewrite(io.BytesIO(dump.encode()), sink)
+    return sink.getvalue().decode(), unchanged
+
+
+def test_unchanged_tables_are_spliced_before_the_first_table_data(tmp_path):
+    cache = TableCache(str(tmp_path))
+    first, unchanged = anonymised(SCHEMA + TALKS_DATA + USERS_DATA + POST_DATA, cache, FINGERPRINTS)
+    assert unchanged == []
+    anonymised_users = first[len(SCHEMA + TALKS_DATA):-len(POST_DATA)]
+    assert 'ada@example.com' not in anonymised_users
+
+    second, unchanged = anonymised(SCHEMA + TALKS_DATA + POST_DATA, cache, FINGERPRINTS)
+
+    assert unchanged == [('public', 'users')]
+    assert second == SCHEMA + anonymised_users + TALKS_DATA + POST_DATA
+
+
+def test_unchanged_tables_are_spliced_before_the_post_data(tmp_path):
+    cache = TableCache(str(tmp_path))
+    first, _ = anonymised(SCHEMA + USERS_DATA + POST_DATA, cache, FINGERPRINTS)
+
+    second, _ = anonymised(SCHEMA + POST_DATA, cache, FINGERPRINTS)
+
+    assert second == first
+
+
+@pytest.mark.parametrize('fingerprints, columns', [
+    ({('public', 'users'): b'16386:16386:1001:0:0::id integer, email text'}, None),
+    (FINGERPRINTS, {'users.email': {'value': 'x@fake.com'}}),
+])
+def test_changed_tables_or_rules_are_dumped_again(tmp_path, fingerprints, columns):
+    cache = TableCache(str(tmp_path))
+    anonymised(SCHEMA + USERS_DATA + POST_DATA, cache, FINGERPRINTS)
+
+    _, unchanged = anonymised(SCHEMA + USERS_DATA + POST_DATA, cache, fingerprints, columns)
+
+    assert unchanged == []
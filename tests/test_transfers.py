@@ -0,0 +1,131 @@
+import os
+
+import boto3
+import pytest
+from cryptography.fernet import Fernet
+from moto import mock_aws
+
+from main import upload_stream
+from storage_s3 import S3Storage
+
+BUCKET = 'dumps'
+KEY = Fernet.generate_key()
+# the smallest part S3 accepts, except for the last one
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+class FlakyStorage(S3Storage):
+    """
+    Transfers one part at a time and records them, failing on `fail_on` as a
+    dropped connection would.
+    """
+
+    def __init__(self, fail_on: int | None = None):
+        super().__init__(BUCKET, part_size=PART_SIZE, concurrency=1)
+        self.fail_on = fail_on
+        self.parts = []
+
+    def upload_part(self, key: str, upload_id: str, number: int, data: bytes) -> str:
+        self._transfer(number)
+        return super().upload_part(key, upload_id, number, data)
+
+    def read_range(self, key: str, start: int, end: int, etag: str):
+        self._transfer(start // PART_SIZE)
+        return super().read_range(key, start, end, etag)
+
+    def _transfer(self, number: int):
+        if number == self.fail_on:
+            raise ConnectionError("connection reset")
+
+        self.parts.append(number)
+
+
+def test_interrupted_upload_resumes_from_manifest(s3, tmp_path):
+    source = tmp_path / 'anonymised.sql.enc'
+    data = os.urandom(2 * PART_SIZE + 1234)
+    source.write_bytes(data)
+
+    # the last part, a part after the failing one may already be on its way
+    with pytest.raises(ConnectionError):
+        FlakyStorage(fail_on=2).upload(str(source), 'dump.enc')
+
+    resumed = FlakyStorage()
+    assert resumed.can_resume_upload(str(source), 'dump.enc')
+    resumed.upload(str(source), 'dump.enc')
+
+    assert resumed.parts == [2]
+    assert s3.get_object(Bucket=BUCKET, Key='dump.enc')['Body'].read() == data
+    assert not os.path.exists(f'{source}.upload-parts')
+
+
+def test_upload_starts_over_when_source_changed(s3, tmp_path):
+    source = tmp_path / 'anonymised.sql.enc'
+    source.write_bytes(os.urandom(2 * PART_SIZE))
+
+    with pytest.raises(ConnectionError):
+        FlakyStorage(fail_on=1).upload(str(source), 'dump.enc')
+
+    data = os.urandom(2 * PART_SIZE + 1)
+    source.write_bytes(data)
+    restarted = FlakyStorage()
+    assert not restarted.can_resume_upload(str(source), 'dump.enc')
+    restarted.upload(str(source), 'dump.enc')
+
+    assert restarted.parts == [0, 1, 2]
+    assert s3.get_object(Bucket=BUCKET, Key='dump.enc')['Body'].read() == data
+
+
+def test_interrupted_download_resumes_from_manifest(s3, tmp_path):
+    data = os.urandom(2 * PART_SIZE + 1234)
+    s3.put_object(Bucket=BUCKET, Key='dump.enc', Body=data)
+    destination = tmp_path / 'dump.sql.enc'
+
+    with pytest.raises(ConnectionError):
+        FlakyStorage(fail_on=2).download('dump.enc', str(destination))
+
+    resumed = FlakyStorage()
+    resumed.download('dump.enc', str(destination))
+
+    assert resumed.parts == [2]
+    assert destination.read_bytes() == data
+    assert not os.path.exists(f'{destination}.parts')
+
+
+def test_download_starts_over_when_object_changed(s3, tmp_path):
+    s3.put_object(Bucket=BUCKET, Key='dump.enc', Body=os.urandom(2 * PART_SIZE))
+    destination = tmp_path / 'dump.sql.enc'
+
+    with pytest.raises(ConnectionError):
+        FlakyStorage(fail_on=1).download('dump.enc', str(destination))
+
+    # the parts already downloaded belong to the previous object
+    data = os.urandom(2 * PART_SIZE)
+    s3.put_object(Bucket=BUCKET, Key='dump.enc', Body=data)
+    restarted = FlakyStorage()
+    restarted.download('dump.enc', str(destination))
+
+    assert restarted.parts == [0, 1]
+    assert destination.read_bytes() == data
+
+
+def test_failed_stream_aborts_the_upload(s3, monkeypatch):
+    monkeypatch.setenv('ENCRYPTION_KEY', KEY.decode())
+
+    with pytest.raises(RuntimeError):
+        with upload_stream({'upload': {}}, FlakyStorage(), 'dump.enc') as artifact:
+            artifact.write(os.urandom(PART_SIZE + 1))
+            raise RuntimeError("pg_dump exited with status 1")
+
+    assert 'Contents' not in s3.list_objects_v2(Bucket=BUCKET)
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket=BUCKET)
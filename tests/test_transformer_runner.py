@@ -0,0 +1,163 @@
+import threading
+
+import pytest
+
+from instrumentation import span
+from transformer_runner import (
+    SETUP,
+    TEARDOWN,
+    Chunks,
+    Transformer,
+    TransformerError,
+    _run_chunks,
+    _validate,
+    affected_rows,
+    load_transformers,
+    run_graph,
+)
+
+
+def transformer(name: str, *depends: str) -> Transformer:
+    return Transformer(name, frozenset(depends))
+
+
+class FakePsql:
+    """
+    Records the files run, failing on the ones in `fail`.
+    """
+
+    def __init__(self, fail: tuple[str, ...] = ()):
+        self.fail = fail
+        self.files = []
+        self._lock = threading.Lock()
+
+    def __call__(self, args: list[str]) -> str:
+        name = args[args.index('-f') + 1]
+        with self._lock:
+            self.files.append(name)
+        if name in self.fail:
+            raise RuntimeError(f'psql:{name}:1: ERROR:  deadlock detected')
+
+        return 'UPDATE 2\n'
+
+
+def test_circular_dependencies_are_refused():
+    with pytest.raises(ValueError, match='circular dependencies: a.sql, b.sql$'):
+        _validate([transformer('a.sql', 'b.sql'), transformer('b.sql', 'a.sql'), transformer('c.sql')])
+
+
+def test_unknown_dependencies_are_refused():
+    with pytest.raises(ValueError, match='a.sql depends on unknown transformer'):
+        _validate([transformer('a.sql', 'missing.sql')])
+
+
+def test_transformers_listed_twice_are_refused():
+    with pytest.raises(ValueError, match='more than once'):
+        _validate([transformer('a.sql'), transformer('a.sql')])
+
+
+def test_header_dependencies_on_unlisted_transformers_are_ignored(tmp_path):
+    (tmp_path / 'users.sql').write_text('-- depends: subset.sql\nUPDATE users SET name = NULL;\n')
+    (tmp_path / 'subset.sql').write_text('')
+    (tmp_path / 'grants.sql').write_text('-- depends: users.sql\n-- chunks: grants.id\n')
+
+    transformers = load_transformers(['users.sql', {'name': 'grants.sql', 'chunk_size': 10}], tmp_path)
+
+    assert transformers == [
+        transformer('users.sql'),
+        Transformer('grants.sql', frozenset({'users.sql'}), Chunks('grants', 'id', 10, 4)),
+    ]
+
+
+def test_header_dependencies_on_missing_files_are_refused(tmp_path):
+    (tmp_path / 'users.sql').write_text('-- depends: typo.sql\n')
+
+    with pytest.raises(ValueError, match='unknown transformer'):
+        load_transformers(['users.sql'], tmp_path)
+
+
+def test_transformers_run_after_their_dependencies():
+    psql = FakePsql()
+    completed = []
+    run_graph(
+        [transformer('grants.sql', 'users.sql'), transformer('users.sql'), transformer('talks.sql', 'grants.sql')],
+        psql,
+        completed=completed,
+    )
+
+    assert psql.files[0] == SETUP and psql.files[-1] == TEARDOWN
+    assert psql.files.index('users.sql') < psql.files.index('grants.sql') < psql.files.index('talks.sql')
+    assert completed == ['users.sql', 'grants.sql', 'talks.sql']
+
+
+def test_completed_transformers_are_skipped():
+    psql = FakePsql()
+    completed = ['users.sql']
+    run_graph([transformer('users.sql'), transformer('grants.sql', 'users.sql')], psql, completed=completed)
+
+    assert psql.files == [SETUP, 'grants.sql', TEARDOWN]
+    assert completed == ['users.sql', 'grants.sql']
+
+
+def test_failure_stops_starting_transformers():
+    psql = FakePsql(fail=('users.sql',))
+    completed = []
+    with pytest.raises(TransformerError) as error:
+        run_graph([transformer('users.sql'), transformer('grants.sql', 'users.sql')], psql, jobs=1, completed=completed)
+
+    assert list(error.value.failures) == ['users.sql']
+    assert 'declare a dependency' in error.value.failures['users.sql']
+    # neither the dependent transformer nor the teardown run
+    assert psql.files == [SETUP, 'users.sql']
+    assert completed == []
+
+
+class FakeChunksTable:
+    """
+    Answers the queries of `_run_chunks` from the ranges not done yet,
+    failing on the range starting at `fail_on`.
+    """
+
+    def __init__(self, starts: list[int], size: int):
+        self.pending = set(starts)
+        self.size = size
+        self.fail_on = None
+        self.updated = []
+
+    def __call__(self, args: list[str]) -> str:
+        if '-tA' in args:
+            return ''.join(f'{start} {start + self.size}\n' for start in sorted(self.pending))
+        if '--single-transaction' not in args:
+            # planning the ranges
+            return ''
+
+        start = int(args[args.index('-v') + 1].partition('=')[2])
+        if start == self.fail_on:
+            raise RuntimeError('canceling statement due to statement timeout')
+
+        self.updated.append(start)
+        self.pending.discard(start)
+        return 'UPDATE 10\nUPDATE 1\n'
+
+
+def test_chunks_resume_with_the_ranges_left():
+    table = FakeChunksTable([0, 10, 20], size=10)
+    chunks = Chunks('users', 'id', size=10, jobs=1)
+
+    table.fail_on = 10
+    with pytest.raises(RuntimeError, match='statement timeout'), span('transformer users.sql'):
+        _run_chunks(table, 'users.sql', chunks)
+    # the next range may have started before the failure was seen
+    assert 10 in table.pending and 0 not in table.pending
+    done_before = len(table.updated)
+
+    table.fail_on = None
+    with span('transformer users.sql') as chunks_span:
+        _run_chunks(table, 'users.sql', chunks)
+    # every range is updated once
+    assert sorted(table.updated) == [0, 10, 20]
+    assert chunks_span.counters['rows'] == 10 * (3 - done_before)
+
+
+def test_affected_rows():
+    assert affected_rows('UPDATE 3\nINSERT 0 2\nDELETE 1\nSELECT 7\nALTER TABLE\n') == 6
@@ -0,0 +1,284 @@
+"""
+Run the SQL transformers of a config concurrently, following their declared
+dependencies.
+
+Transformers without dependencies between them run at the same time, each
+over its own connection. Dependencies are declared in the config:
+
+    transformers:
+      - users.sql
+      - name: grants.sql
+        depends: [users.sql]
+
+or in a header comment at the top of the transformer file:
+
+    -- depends: users.sql, proposals.sql
+
+Header dependencies on transformers that the config doesn't list are
+ignored, so that a file can be shared by configs that don't run the files it
+waits for. Transformers rewriting tables linked by foreign keys lock both
+tables and have to depend on each other, or they can deadlock.
+
+A transformer can also be split in primary key ranges, which are updated
+concurrently and each committed on its own:
+
+    -- chunks: users.id
+    UPDATE users SET ... WHERE id >= :chunk_start AND id < :chunk_end;
+
+Completed ranges are recorded in the `anonymizer_chunks` table of the
+database, so running the transformers again on the database of a failed run
+(`anonymise` keeps it, see `database_pool`) only updates the ranges that are
+left. The range size and the number of concurrent
+ranges are set with `chunk_size` and `chunk_jobs` in the config entry of the
+transformer.
+
+`functions.sql` runs before every transformer and `drop-functions.sql` once
+they have all succeeded. After the first failure no new transformer is
+started; the ones already running are waited for and every failure is
+reported with the file it came from.
+"""
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, NamedTuple, TypedDict
+
+from rich import print
+
+from instrumentation import current_span, propagate, span
+
+SETUP = 'functions.sql'
+TEARDOWN = 'drop-functions.sql'
+DEFAULT_JOBS = 4
+DEFAULT_CHUNK_SIZE = 50_000
+CHUNKS_TABLE = 'anonymizer_chunks'
+
+_DEPENDS_HEADER = re.compile(r'^--\s*depends:\s*(?P<names>.*)$')
+_CHUNKS_HEADER = re.compile(r'^--\s*chunks:\s*(?P<table>\S+)\.(?P<column>[^.\s]+)$')
+_ROWS_TAG = re.compile(r'^(?:(?:UPDATE|DELETE|COPY|MERGE) (?P<rows>\d+)|INSERT \d+ (?P<inserted>\d+))$', re.MULTILINE)
+
+
+class TransformerDict(TypedDict):
+    name: str
+    depends: list[str]
+    chunk_size: int
+    chunk_jobs: int
+
+
+class Chunks(NamedTuple):
+    table: str
+    column: str
+    size: int
+    jobs: int
+
+
+class Transformer(NamedTuple):
+    name: str
+    depends: frozenset[str]
+    chunks: Chunks | None = None
+
+
+class TransformerError(Exception):
+    def __init__(self, failures: dict[str, str]):
+        self.failures = failures
+        details = '\n'.join(f'{name}: {error}' for name, error in failures.items())
+        super().__init__(f"{len(failures)} transformer(s) failed:\n{details}")
+
+
+def read_header(path: Path) -> tuple[set[str], tuple[str, str] | None]:
+    depends = set()
+    chunks = None
+    with open(path) as stream:
+        for line in stream:
+            line = line.strip()
+            if not line.startswith('--'):
+                break
+
+            if match := _DEPENDS_HEADER.match(line):
+                depends.update(name.strip() for name in match['names'].split(',') if name.strip())
+            elif match := _CHUNKS_HEADER.match(line):
+                chunks = match['table'], match['column']
+
+    return depends, chunks
+
+
+def load_transformers(entries: list[str | TransformerDict], folder: Path) -> list[Transformer]:
+    entries = [{'name': entry, 'depends': []} if isinstance(entry, str) else entry for entry in entries]
+    listed = {entry['name'] for entry in entries}
+
+    transformers = []
+    for entry in entries:
+        name = entry['name']
+        header_depends, header_chunks = read_header(folder / name)
+        if missing := {depend for depend in header_depends - listed if not (folder / depend).is_file()}:
+            raise ValueError(f"{name} depends on unknown transformer(s) {', '.join(sorted(missing))}")
+
+        depends = set(entry.get('depends', [])) | (header_depends & listed)
+
+        chunks = None
+        if header_chunks:
+            chunks = Chunks(
+                *header_chunks,
+                size=entry.get('chunk_size', DEFAULT_CHUNK_SIZE),
+                jobs=entry.get('chunk_jobs', DEFAULT_JOBS),
+            )
+
+        transformers.append(Transformer(name, frozenset(depends), chunks))
+
+    _validate(transformers)
+    return transformers
+
+
+def _validate(transformers: list[Transformer]):
+    names = {transformer.name for transformer in transformers}
+    if len(names) != len(transformers):
+        raise ValueError("Transformers are listed more than once")
+
+    for transformer in transformers:
+        if unknown := transformer.depends - names:
+            raise ValueError(f"{transformer.name} depends on unknown transformer(s) {', '.join(sorted(unknown))}")
+
+    # Kahn's algorithm, whatever is left over is part of a cycle
+    remaining = {transformer.name: set(transformer.depends) for transformer in transformers}
+    while ready := [name for name, depends in remaining.items() if not depends]:
+        for name in ready:
+            del remaining[name]
+        for depends in remaining.values():
+            depends.difference_update(ready)
+
+    if remaining:
+        raise ValueError(f"Transformers have circular dependencies: {', '.join(sorted(remaining))}")
+
+
+def run_graph(
+    transformers: list[Transformer],
+    psql: Callable[[list[str]], str],
+    *,
+    jobs: int = DEFAULT_JOBS,
+    completed: list[str] | None = None,
+):
+    """
+    Run the setup step, every transformer (as soon as its dependencies are
+    done) and the teardown step. `psql` runs psql with the given arguments
+    against the database, returns its output and raises when it fails.
+
+    The transformers in `completed` were done by a previous run on the same
+    database and are skipped, the ones done by this run are added to it.
+    """
+    completed = [] if completed is None else completed
+    _run_timed(psql, Transformer(SETUP, frozenset()))
+
+    done: set[str] = set(completed)
+    pending = {transformer.name: transformer for transformer in transformers if transformer.name not in done}
+    if done:
+        print(f"=> Skipping {len(done)} transformer(s) done by the failed run")
+    failures: dict[str, str] = {}
+    running: dict[Future, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        while pending or running:
+            if not failures:
+                for name, transformer in list(pending.items()):
+                    if transformer.depends <= done:
+                        running[executor.submit(propagate(_run_timed), psql, transformer)] = name
+                        del pending[name]
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if error := future.exception():
+                    failures[name] = _explain(str(error))
+                else:
+                    done.add(name)
+                    completed.append(name)
+
+    if failures:
+        raise TransformerError(failures)
+
+    _run_timed(psql, Transformer(TEARDOWN, frozenset()))
+
+
+def _run_timed(psql: Callable[[list[str]], str], transformer: Transformer):
+    started_at = time.monotonic()
+    with span(f'transformer {transformer.name}') as transformer_span:
+        if transformer.chunks:
+            _run_chunks(psql, transformer.name, transformer.chunks)
+        else:
+            transformer_span.add('rows', affected_rows(psql(['-f', transformer.name])))
+
+    print(f"=> Transformer {transformer.name} done in {time.monotonic() - started_at:.1f}s")
+
+
+def _explain(error: str) -> str:
+    if 'deadlock detected' in error:
+        return (
+            f"{error}\nTransformers running at the same time locked the same tables, "
+            "declare a dependency between them (transformers rewriting tables linked by foreign keys lock both)"
+        )
+
+    return error
+
+
+def affected_rows(output: str) -> int:
+    """
+    Sum the rows of the command tags printed by psql.
+    """
+    return sum(int(match['rows'] or match['inserted']) for match in _ROWS_TAG.finditer(output))
+
+
+def _run_chunks(psql: Callable[[list[str]], str], name: str, chunks: Chunks):
+    transformer = _literal(name)
+
+    # The ranges are only planned once, a rerun picks up the same ones
+    psql(['-c', f"""
+        CREATE TABLE IF NOT EXISTS {CHUNKS_TABLE} (
+            transformer text NOT NULL,
+            chunk_start bigint NOT NULL,
+            chunk_end bigint NOT NULL,
+            done boolean NOT NULL DEFAULT false,
+            PRIMARY KEY (transformer, chunk_start)
+        );
+        INSERT INTO {CHUNKS_TABLE} (transformer, chunk_start, chunk_end)
+        SELECT {transformer}, chunk_start, chunk_start + {chunks.size}
+        FROM (SELECT min({chunks.column}) AS low, max({chunks.column}) AS high FROM {chunks.table}) AS bounds,
+            generate_series(low::bigint, high::bigint, {chunks.size}) AS chunk_start
+        WHERE NOT EXISTS (SELECT FROM {CHUNKS_TABLE} WHERE transformer = {transformer})
+    """])
+
+    output = psql(['-tA', '-F', ' ', '-c', f"""
+        SELECT chunk_start, chunk_end FROM {CHUNKS_TABLE}
+        WHERE transformer = {transformer} AND NOT done
+        ORDER BY chunk_start
+    """])
+    ranges = [tuple(line.split()) for line in output.splitlines() if line.strip()]
+    print(f"=> Transformer {name}: {len(ranges)} range(s) of {chunks.size} to update")
+
+    chunks_span = current_span()
+
+    def run_range(start: str, end: str):
+        # the range is marked as done in the same transaction that updates it
+        output = psql([
+            '--single-transaction',
+            '-v', f'chunk_start={start}',
+            '-v', f'chunk_end={end}',
+            '-f', name,
+            '-c', f"UPDATE {CHUNKS_TABLE} SET done = true WHERE transformer = {transformer} AND chunk_start = {start}",
+        ])
+        # minus the progress update
+        chunks_span.add('rows', affected_rows(output) - 1)
+
+    with ThreadPoolExecutor(max_workers=max(chunks.jobs, 1)) as executor:
+        futures = [executor.submit(run_range, start, end) for start, end in ranges]
+        finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+
+        for future in finished:
+            if future.exception():
+                executor.shutdown(cancel_futures=True)
+                raise future.exception()
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
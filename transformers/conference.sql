@@ -1,5 +1,5 @@
 UPDATE conferences_conference
 SET
-    pretix_organizer_id = "test-organizer",
-    pretix_event_id = "staging-event",
+    pretix_organizer_id = 'test-organizer',
+    pretix_event_id = 'staging-event',
     pretix_speaker_voucher_quota_id = 103;
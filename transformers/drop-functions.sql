@@ -5,3 +5,8 @@ DROP FUNCTION random_username;
 DROP FUNCTION random_date_of_birth;
 DROP FUNCTION random_word;
 DROP FUNCTION random_text;
+DROP FUNCTION fake_first_names;
+DROP FUNCTION fake_last_names;
+DROP FUNCTION fake_words;
+DROP FUNCTION rewrite_table;
+DROP TABLE IF EXISTS anonymizer_chunks;
@@ -1,7 +1,12 @@
-CREATE FUNCTION random_first_name()
-  RETURNS text
+-- Dictionaries are immutable, so Postgres builds each array once per
+-- statement. They are name[] rather than text[]: elements of a fixed width
+-- are picked by offset, while finding the n-th text element walks the
+-- array from its start on every call.
+CREATE OR REPLACE FUNCTION fake_first_names()
+  RETURNS name[]
+  IMMUTABLE PARALLEL SAFE
 AS $$
-    select (
+    select
         array[
             'Aaliyah','Abagail','Abbey','Abbie','Abbigail','Abby','Abigail','Abigale','Abigayle','Abril','Achsah','Ada','Adah','Adaline','Adalyn','Adalynn','Adamaris','Adda','Addie','Addison',
             'Addisyn','Addyson','Adel','Adela','Adelaide','Adele','Adelia','Adelina','Adeline','Adell','Adella','Adelle','Adelyn','Adelynn','Adilene','Adina','Adison','Adline','Adria','Adriana','Adriane',
@@ -15,15 +20,22 @@ AS $$
             'Alfonse','Alfonso','Alfonzo','Alford','Alfred','Alfredo','Alger','Algernon','Algie','Algot',
             'Ali','Alijah','Allan','Allen','Allyn','Almer','Almon','Almond','Almus','Alois','Alonso','Alonza','Alonzo','Aloys',
             'Aloysius','Alpheus', 'Alphons','Alphonse','Alphonso','Alphonsus','Alston','Alto','Alton'
-        ]
-    )[floor(random() * 233 + 1)];
+        ]::name[];
 $$ LANGUAGE SQL;
 
 
-CREATE FUNCTION random_last_name()
+CREATE OR REPLACE FUNCTION random_first_name()
   RETURNS text
 AS $$
-    select (
+    select (fake_first_names())[floor(random() * cardinality(fake_first_names()) + 1)::int]::text;
+$$ LANGUAGE SQL;
+
+
+CREATE OR REPLACE FUNCTION fake_last_names()
+  RETURNS name[]
+  IMMUTABLE PARALLEL SAFE
+AS $$
+    select
         array[
             'Abbott','Abernathy','Abshire','Adams','Altenwerth','Anderson','Ankunding',
             'Armstrong','Auer','Aufderhar','Bahringer','Bailey','Balistreri','Barrows','Bartell','Bartoletti','Barton','Bashirian','Batz','Bauch','Baumbach','Bayer','Beahan','Beatty','Bechtelar','Becker','Bednar','Beer','Beier','Berge','Bergnaum','Bergstrom','Bernhard','Bernier','Bins',
@@ -40,27 +52,33 @@ AS $$
             'Schmitt','Schneider','Schoen','Schowalter','Schroeder','Schulist','Schultz','Schumm','Schuppe','Schuster','Senger','Shanahan','Shields','Simonis','Sipes','Skiles','Smith','Smitham','Spencer','Spinka','Sporer','Stamm','Stanton','Stark','Stehr','Steuber','Stiedemann','Stokes','Stoltenberg','Stracke','Streich','Stroman','Strosin','Swaniawski','Swift','Terry','Thiel','Thompson','Tillman',
             'Torp','Torphy','Towne','Toy','Trantow','Tremblay','Treutel','Tromp','Turcotte','Turner','Ullrich','Upton','Vandervort','Veum','Volkman','Von','VonRueden','Waelchi','Walker','Walsh','Walter','Ward','Waters','Watsica','Weber','Wehner','Weimann','Weissnat','Welch','West','White','Wiegand','Wilderman','Wilkinson','Will','Williamson','Willms','Windler','Wintheiser','Wisoky','Wisozk','Witting','Wiza','Wolf','Wolff','Wuckert','Wunsch','Wyman',
             'Yost','Yundt','Zboncak','Zemlak','Ziemann','Zieme','Zulauf'
-        ]
-    )[floor(random() * 344 + 1)];
+        ]::name[];
+$$ LANGUAGE SQL;
+
+
+CREATE OR REPLACE FUNCTION random_last_name()
+  RETURNS text
+AS $$
+    select (fake_last_names())[floor(random() * cardinality(fake_last_names()) + 1)::int]::text;
 $$ LANGUAGE SQL;
 
 
 
-CREATE FUNCTION random_email()
+CREATE OR REPLACE FUNCTION random_email()
   RETURNS text
 AS $$
     SELECT md5(random()::text || clock_timestamp()::text)::text || '@fake.com';
 $$ LANGUAGE SQL;
 
 
-CREATE FUNCTION random_username()
+CREATE OR REPLACE FUNCTION random_username()
   RETURNS text
 AS $$
     SELECT md5(random()::text || clock_timestamp()::text)::text;
 $$ LANGUAGE SQL;
 
 
-CREATE FUNCTION random_date_of_birth()
+CREATE OR REPLACE FUNCTION random_date_of_birth()
   RETURNS date
 AS $$
     SELECT (timestamp '1950-01-10 20:00:00' +
@@ -69,10 +87,11 @@ AS $$
 $$ LANGUAGE SQL;
 
 
-CREATE FUNCTION random_word()
-  RETURNS text
+CREATE OR REPLACE FUNCTION fake_words()
+  RETURNS name[]
+  IMMUTABLE PARALLEL SAFE
 AS $$
-    select (
+    select
         array[
             'requiro', 'plurimum', 'praesum', 'auctoritas', 'pergo', 'abbatis', 'precis',
             'temptatio', 'fusus', 'itis', 'brachants', 'egretudo', 'remuneror', 'coerceo', 'enumero',
@@ -81,12 +100,219 @@ AS $$
             'vovi', 'saluto', 'sententia', 'prorsus', 'jugis', 'pervalidus', 'mellis', 'oratio', 'nonus', 'infeste', 'competo', 'sedo', 'expiscor', 'quippe', 'cunctator', 'santiago', 'suffragium', 'culpa', 'incipio', 'quidnam', 'pupugi', 'distringo', 'aliquantus', 'parilis',
             'calco', 'lama', 'glorior', 'lamnia', 'amissus', 'intercipio', 'personam', 'verto', 'decipio', 'civilis', 'dolor', 'universi', 'fabula', 'vulticulus', 'ops', 'emi', 'quantumcumque', 'informatio', 'ager', 'vestri', 'defungo', 'fidelis', 'cursus', 'levamen', 'quicquid',
             'prolicio', 'reprehendo', 'audacter', 'perfeci', 'tremo', 'pevela', 'fugio', 'premo', 'deprehensio', 'oneself', 'pacis', 'peracto', 'cilicium', 'paganus', 'urbs', 'uxor', 'nasci', 'iucundus', 'contemplor', 'ploratus', 'copiae', 'pium', 'rapui', 'iuxta', 'cogo', 'cohibeo', 'estas', 'luxuria'
-        ]
-    )[floor(random() * 136 + 1)];
+        ]::name[];
 $$ LANGUAGE sql;
 
-CREATE FUNCTION random_text()
+
+CREATE OR REPLACE FUNCTION random_word()
+  RETURNS text
+AS $$
+    select (fake_words())[floor(random() * cardinality(fake_words()) + 1)::int]::text;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION random_text()
   RETURNS text
 AS $$
     SELECT random_word() || ' ' || random_word() || ' ' || random_word() || ' ' || random_word() || ' ' || random_word();
 $$ LANGUAGE SQL;
+
+
+-- Rewrites a table instead of updating it in place: the anonymised rows are
+-- copied into a fresh table, which replaces the original, and its indexes,
+-- constraints and triggers are then built once on the final data. An UPDATE
+-- leaves a dead copy of every row behind and maintains every index per row.
+--
+-- `assignments` maps columns to SQL expressions, which can refer to the
+-- original columns. With a `condition` only the matching rows are changed.
+--
+-- The comment, owner, grants, column grants, row level security switches,
+-- replica identity and extended statistics carry over as well. Tables with
+-- views, rules or row level security policies depending on them are refused,
+-- as dropping them would drop those too; publication memberships are lost.
+--
+--   SELECT rewrite_table('users', jsonb_build_object(
+--       'name', 'random_first_name()',
+--       'password', $$'!'$$
+--   ), condition => 'is_staff = false');
+CREATE OR REPLACE FUNCTION rewrite_table(target regclass, assignments jsonb, condition text DEFAULT NULL)
+  RETURNS void
+AS $$
+DECLARE
+    relation pg_class;
+    rewritten text;
+    columns text[] := '{}';
+    expressions text[] := '{}';
+    attribute record;
+    expression text;
+    definitions text[];
+    foreign_keys text[];
+    privileges text[];
+    properties text[];
+    dependents text;
+    owned record;
+    identities text[] := '{}';
+    statement text;
+BEGIN
+    SELECT * INTO relation FROM pg_class WHERE oid = target;
+
+    IF relation.relkind <> 'r' OR EXISTS (SELECT FROM pg_inherits WHERE inhrelid = target OR inhparent = target) THEN
+        RAISE EXCEPTION 'rewrite_table: % is not a plain table', target;
+    END IF;
+
+    SELECT string_agg(DISTINCT CASE WHEN rule.ev_class = target THEN format('rule %I', rule.rulename) ELSE rule.ev_class::regclass::text END, ', ')
+    INTO dependents
+    FROM pg_depend AS d
+    JOIN pg_rewrite AS rule ON rule.oid = d.objid
+    WHERE d.classid = 'pg_rewrite'::regclass AND d.refclassid = 'pg_class'::regclass AND d.refobjid = target;
+    IF dependents IS NOT NULL THEN
+        RAISE EXCEPTION 'rewrite_table: % has dependent views or rules (%), anonymise it with UPDATE instead', target, dependents;
+    END IF;
+
+    SELECT string_agg(quote_ident(polname), ', ') INTO dependents FROM pg_policy WHERE polrelid = target;
+    IF dependents IS NOT NULL THEN
+        RAISE EXCEPTION 'rewrite_table: % has row level security policies (%), anonymise it with UPDATE instead', target, dependents;
+    END IF;
+
+    SELECT string_agg(assigned, ', ') INTO expression
+    FROM jsonb_object_keys(assignments) AS assigned
+    WHERE NOT EXISTS (
+        SELECT FROM pg_attribute
+        WHERE attrelid = target AND attname = assigned AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+    );
+    IF expression IS NOT NULL THEN
+        RAISE EXCEPTION 'rewrite_table: % has no column(s) %', target, expression;
+    END IF;
+
+    FOR attribute IN
+        SELECT attname, format_type(atttypid, atttypmod) AS type
+        FROM pg_attribute
+        WHERE attrelid = target AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+    LOOP
+        expression := assignments ->> attribute.attname;
+        IF expression IS NULL THEN
+            expression := quote_ident(attribute.attname);
+        ELSIF condition IS NULL THEN
+            expression := format('(%s)::%s', expression, attribute.type);
+        ELSE
+            expression := format('CASE WHEN %s THEN (%s)::%s ELSE %I END', condition, expression, attribute.type, attribute.attname);
+        END IF;
+
+        columns := columns || quote_ident(attribute.attname);
+        expressions := expressions || expression;
+    END LOOP;
+
+    -- Everything that LIKE doesn't copy, to be recreated on the new table
+    SELECT coalesce(array_agg(format('ALTER TABLE %s ADD CONSTRAINT %I %s', target, conname, pg_get_constraintdef(oid))
+                              ORDER BY position(contype IN 'puxcf'), conname), '{}')
+    INTO definitions
+    FROM pg_constraint
+    WHERE conrelid = target AND contype IN ('p', 'u', 'x', 'c', 'f');
+
+    definitions := definitions || ARRAY(
+        SELECT pg_get_indexdef(indexrelid)
+        FROM pg_index
+        WHERE indrelid = target
+          AND NOT EXISTS (SELECT FROM pg_constraint WHERE conrelid = target AND conindid = indexrelid)
+        ORDER BY indexrelid
+    ) || ARRAY(
+        SELECT pg_get_triggerdef(oid)
+        FROM pg_trigger
+        WHERE tgrelid = target AND NOT tgisinternal
+        ORDER BY tgname
+    );
+
+    SELECT coalesce(array_agg(format('ALTER TABLE %s ADD CONSTRAINT %I %s', conrelid::regclass, conname, pg_get_constraintdef(oid))), '{}')
+    INTO foreign_keys
+    FROM pg_constraint
+    WHERE confrelid = target AND conrelid <> target AND contype = 'f';
+
+    SELECT coalesce(array_agg(format(
+        'GRANT %s ON %s TO %s',
+        privilege_type, target,
+        CASE WHEN grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(grantee)) END
+    )), '{}')
+    INTO privileges
+    FROM aclexplode(relation.relacl)
+    WHERE grantee <> relation.relowner;
+
+    SELECT coalesce(array_agg(format(
+        'GRANT %s (%I) ON %s TO %s',
+        acl.privilege_type, a.attname, target,
+        CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(acl.grantee)) END
+    )), '{}')
+    INTO properties
+    FROM pg_attribute AS a, aclexplode(a.attacl) AS acl
+    WHERE a.attrelid = target AND a.attnum > 0 AND NOT a.attisdropped AND acl.grantee <> relation.relowner;
+
+    properties := properties || ARRAY(
+        SELECT pg_get_statisticsobjdef(oid) FROM pg_statistic_ext WHERE stxrelid = target ORDER BY stxname
+    ) || ARRAY(
+        SELECT format('COMMENT ON TABLE %s IS %L', target, description)
+        FROM pg_description
+        WHERE objoid = target AND classoid = 'pg_class'::regclass AND objsubid = 0
+    ) || ARRAY(
+        SELECT format('ALTER TABLE %s REPLICA IDENTITY %s', target, CASE relation.relreplident
+            WHEN 'n' THEN 'NOTHING'
+            WHEN 'f' THEN 'FULL'
+            ELSE format('USING INDEX %I', (SELECT relname FROM pg_class WHERE oid = i.indexrelid))
+        END)
+        FROM (SELECT NULL::oid AS indexrelid WHERE relation.relreplident IN ('n', 'f')
+              UNION ALL
+              SELECT indexrelid FROM pg_index WHERE indrelid = target AND indisreplident AND relation.relreplident = 'i') AS i
+    ) || ARRAY(
+        SELECT format('ALTER TABLE %s %s ROW LEVEL SECURITY', target, switch)
+        FROM unnest(ARRAY['ENABLE', 'FORCE'], ARRAY[relation.relrowsecurity, relation.relforcerowsecurity]) AS s(switch, enabled)
+        WHERE enabled
+    );
+
+    rewritten := format('%I.%I', (SELECT nspname FROM pg_namespace WHERE oid = relation.relnamespace), left(relation.relname, 50) || '_rewrite');
+
+    EXECUTE format(
+        'CREATE %s TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING GENERATED INCLUDING STORAGE INCLUDING COMMENTS INCLUDING COMPRESSION)',
+        CASE WHEN relation.relpersistence = 'u' THEN 'UNLOGGED' ELSE '' END, rewritten, target
+    );
+    -- before the serial sequences are handed over, which need the same owner
+    EXECUTE format('ALTER TABLE %s OWNER TO %I', rewritten, pg_get_userbyid(relation.relowner));
+    EXECUTE format(
+        'INSERT INTO %s (%s) OVERRIDING SYSTEM VALUE SELECT %s FROM %s',
+        rewritten, array_to_string(columns, ', '), array_to_string(expressions, ', '), target
+    );
+
+    -- Sequences follow their columns: serial ones are handed over to the new
+    -- table, identity ones were recreated by LIKE and continue from the old value.
+    FOR owned IN
+        SELECT d.objid::regclass AS sequence_name, c.relname, a.attname, d.deptype, pg_sequence_last_value(d.objid) AS last_value
+        FROM pg_depend AS d
+        JOIN pg_class AS c ON c.oid = d.objid
+        JOIN pg_attribute AS a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = target AND d.classid = 'pg_class'::regclass AND c.relkind = 'S' AND d.deptype IN ('a', 'i')
+    LOOP
+        IF owned.deptype = 'a' THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY %s.%I', owned.sequence_name, rewritten, owned.attname);
+        ELSE
+            identities := identities || format(
+                'ALTER SEQUENCE %s RENAME TO %I', pg_get_serial_sequence(rewritten, owned.attname), owned.relname
+            );
+            IF owned.last_value IS NOT NULL THEN
+                identities := identities || format('SELECT setval(%L, %s)', owned.sequence_name, owned.last_value);
+            END IF;
+        END IF;
+    END LOOP;
+
+    FOR statement IN
+        SELECT format('ALTER TABLE %s DROP CONSTRAINT %I', conrelid::regclass, conname)
+        FROM pg_constraint
+        WHERE confrelid = target AND conrelid <> target AND contype = 'f'
+    LOOP
+        EXECUTE statement;
+    END LOOP;
+
+    EXECUTE format('DROP TABLE %s', target);
+    EXECUTE format('ALTER TABLE %s RENAME TO %I', rewritten, relation.relname);
+
+    FOREACH statement IN ARRAY identities || definitions || foreign_keys || privileges || properties LOOP
+        EXECUTE statement;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -1,13 +1,15 @@
-UPDATE grants_grant
-SET
-    name = random_first_name(),
-    full_name = random_first_name() || ' ' || random_last_name(),
-    email = random_email(),
-    occupation = 'other',
-    grant_type = 'diversity',
-    python_usage = random_text(),
-    been_to_other_events = random_text(),
-    interested_in_volunteering = 'no',
-    why = random_text(),
-    notes = random_text(),
-    travelling_from = random_text();
+-- depends: users.sql
+-- rewriting users drops and re-adds the foreign keys of this table
+SELECT rewrite_table('grants_grant', jsonb_build_object(
+    'name', 'random_first_name()',
+    'full_name', $$random_first_name() || ' ' || random_last_name()$$,
+    'email', 'random_email()',
+    'occupation', $$'other'$$,
+    'grant_type', $$'diversity'$$,
+    'python_usage', 'random_text()',
+    'been_to_other_events', 'random_text()',
+    'interested_in_volunteering', $$'no'$$,
+    'why', 'random_text()',
+    'notes', 'random_text()',
+    'travelling_from', 'random_text()'
+));
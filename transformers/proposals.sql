@@ -1,4 +1,6 @@
-UPDATE submissions_submission
-SET
-    previous_talk_video = '',
-    notes = random_text();
+-- depends: users.sql
+-- rewriting users drops and re-adds the foreign keys of this table
+SELECT rewrite_table('submissions_submission', jsonb_build_object(
+    'previous_talk_video', $$''$$,
+    'notes', 'random_text()'
+));
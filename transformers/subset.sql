@@ -0,0 +1,73 @@
+-- Keep a referentially consistent subset of the database.
+--
+-- The rows of every root table that don't match its filter are deleted,
+-- then every row referencing a deleted row, following foreign keys until no
+-- row references a missing one. Run before the transformers with the root
+-- filters as JSON:
+--
+--   psql -v roots='{"conferences_conference": "start > now() - interval ''2 years''"}' -f subset.sql
+--
+-- Prints the number of rows deleted from each table.
+
+-- foreign keys are enforced by the deletes below, and user triggers must not
+-- fire for them
+SET session_replication_role = replica;
+
+CREATE FUNCTION pg_temp.subset(roots jsonb)
+  RETURNS TABLE (table_name regclass, deleted bigint)
+AS $$
+DECLARE
+    root record;
+    fk record;
+    parent regclass;
+    pending regclass[] := '{}';
+BEGIN
+    FOR root IN SELECT key::regclass AS target, value AS filter FROM jsonb_each_text(roots) LOOP
+        EXECUTE format('DELETE FROM %s WHERE NOT coalesce((%s), false)', root.target, root.filter);
+        GET DIAGNOSTICS deleted = ROW_COUNT;
+        table_name := root.target;
+        RETURN NEXT;
+
+        IF deleted > 0 AND NOT root.target = ANY(pending) THEN
+            pending := pending || root.target;
+        END IF;
+    END LOOP;
+
+    WHILE cardinality(pending) > 0 LOOP
+        parent := pending[1];
+        pending := pending[2:];
+
+        -- MATCH SIMPLE: rows with a null in the key don't reference anything
+        FOR fk IN
+            SELECT
+                c.conrelid::regclass AS child,
+                string_agg(format('c.%I IS NOT NULL', ca.attname), ' AND ') AS not_null,
+                string_agg(format('p.%I = c.%I', pa.attname, ca.attname), ' AND ') AS matches
+            FROM pg_constraint c
+            CROSS JOIN unnest(c.conkey, c.confkey) AS k (child_column, parent_column)
+            JOIN pg_attribute ca ON ca.attrelid = c.conrelid AND ca.attnum = k.child_column
+            JOIN pg_attribute pa ON pa.attrelid = c.confrelid AND pa.attnum = k.parent_column
+            -- constraints cloned on partitions are covered by their parent's
+            WHERE c.contype = 'f' AND c.confrelid = parent AND c.conparentid = 0
+            GROUP BY c.oid, c.conrelid
+        LOOP
+            EXECUTE format(
+                'DELETE FROM %s c WHERE %s AND NOT EXISTS (SELECT FROM %s p WHERE %s)',
+                fk.child, fk.not_null, parent, fk.matches
+            );
+            GET DIAGNOSTICS deleted = ROW_COUNT;
+
+            IF deleted > 0 THEN
+                table_name := fk.child;
+                RETURN NEXT;
+
+                IF NOT fk.child = ANY(pending) THEN
+                    pending := pending || fk.child;
+                END IF;
+            END IF;
+        END LOOP;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT table_name, sum(deleted) FROM pg_temp.subset(:'roots'::jsonb) GROUP BY table_name ORDER BY table_name::text;